@@ -1,6 +1,5 @@
 import { useState, useEffect } from 'react';
 import { useLocation, useParams, Link } from 'react-router-dom';
-import axios from 'axios';
 
 const FeedbackPage = () => {
   const { video_id } = useParams();
@@ -9,8 +8,18 @@ const FeedbackPage = () => {
   const [chatInput, setChatInput] = useState('');
   const [chatHistory, setChatHistory] = useState([]);
   const [chatError, setChatError] = useState(null);
+  // The gallery only passes its card fields, so advice and chapters may need loading
+  const [video, setVideo] = useState(state?.advice ? state : null);
 
-  const { video_path = '', advice = { good: [], bad: [], improve: [] }, chapters = [], summary = '' } = state || {};
+  useEffect(() => {
+    if (video) return;
+    fetch(`http://localhost:5000/api/videos/${video_id}`)
+      .then((response) => (response.ok ? response.json() : null))
+      .then((data) => data && setVideo(data))
+      .catch((err) => console.error('Error fetching video:', err));
+  }, [video_id]);
+
+  const { video_path = '', advice = { good: [], bad: [], improve: [] }, chapters = [], summary = '' } = video || state || {};
 
   const handleTabChange = (tab) => {
     setActiveTab(tab);
@@ -24,16 +33,41 @@ const FeedbackPage = () => {
   const handleChatSubmit = async (e) => {
     e.preventDefault();
     if (!chatInput.trim()) return;
+    const message = chatInput;
+    // The server only returns its recent window of turns, so keep the full transcript here
+    const appendToReply = (text) => setChatHistory((prev) => {
+      const last = prev[prev.length - 1];
+      return [...prev.slice(0, -1), { ...last, ai: last.ai + text }];
+    });
     try {
-      console.log('Sending chat message:', chatInput);
-      const response = await axios.post('http://localhost:5000/api/chat', {
-        video_id,
-        message: chatInput,
-        summary
-      });
-      console.log('Chat response:', response.data);
-      setChatHistory(response.data.history);
+      console.log('Sending chat message:', message);
+      setChatHistory((prev) => [...prev, { user: message, ai: '' }]);
       setChatInput('');
+      // Stream the reply over Server-Sent Events so it renders as it is generated
+      const response = await fetch('http://localhost:5000/api/chat/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ video_id, message, summary }),
+      });
+      if (!response.ok) throw new Error(`Chat request failed with ${response.status}`);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1];
+          const data = raw.match(/^data: (.*)$/m)?.[1];
+          if (!event || !data) continue;
+          const payload = JSON.parse(data);
+          if (event === 'token') appendToReply(payload.text);
+          else if (event === 'error') throw new Error(payload.error);
+        }
+      }
     } catch (err) {
       console.error('Chat submit error:', err);
       setChatError('Failed to get AI response. Try again later.');
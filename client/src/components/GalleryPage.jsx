@@ -2,8 +2,14 @@ import { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import axios from 'axios';
 
+// Only what the cards render; the feedback page loads the full record
+const GALLERY_FIELDS = 'video_id,filename,thumbnail_url,summary,video_path';
+const PAGE_SIZE = 24;
+
 const GalleryPage = () => {
   const [videos, setVideos] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
   const [loadingThumbnails, setLoadingThumbnails] = useState({});
   const [thumbnailErrors, setThumbnailErrors] = useState({});
@@ -34,10 +40,11 @@ const GalleryPage = () => {
       });
       if (response.data.error) {
         setThumbnailErrors(prev => ({ ...prev, [video_id]: response.data.error }));
+      } else {
+        setVideos(prev => prev.map(video => (
+          video.video_id === video_id ? { ...video, thumbnail_url: response.data.image_url } : video
+        )));
       }
-      // Refetch videos to update thumbnail_urls
-      const updatedResponse = await axios.get('http://localhost:5000/api/videos');
-      setVideos(updatedResponse.data);
     } catch (err) {
       console.error(`Failed to generate thumbnail for video ${video_id}:`, err);
       setThumbnailErrors(prev => ({ ...prev, [video_id]: err.response?.data?.error || 'Failed to generate thumbnail' }));
@@ -45,28 +52,35 @@ const GalleryPage = () => {
     setLoadingThumbnails(prev => ({ ...prev, [video_id]: false }));
   }, 1000);
 
-  useEffect(() => {
-    const fetchVideos = async () => {
-      try {
-        console.log('Fetching videos from backend');
-        const response = await axios.get('http://localhost:5000/api/videos');
-        console.log('Received videos:', response.data);
-        setVideos(response.data);
+  // Fetch one page of the catalog, starting after `cursor` (the first page when it is null)
+  const fetchVideos = async (cursor = null) => {
+    setLoadingMore(true);
+    try {
+      console.log('Fetching videos from backend');
+      const params = { fields: GALLERY_FIELDS, limit: PAGE_SIZE };
+      if (cursor) params.cursor = cursor;
+      const response = await axios.get('http://localhost:5000/api/videos', { params });
+      console.log('Received videos:', response.data);
+      setVideos(prev => (cursor ? [...prev, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
 
-        // Initialize loading state and generate thumbnails
-        const initialLoading = {};
-        response.data.forEach(video => {
-          if (!video.thumbnail_url || video.thumbnail_url === 'http://localhost:5173/placeholder.png') {
-            initialLoading[video.video_id] = true;
-            generateThumbnail(video.video_id, video.summary);
-          }
-        });
-        setLoadingThumbnails(initialLoading);
-      } catch (err) {
-        console.error('Error fetching videos:', err);
-        setError('Failed to load videos. Please try again later.');
-      }
-    };
+      // Initialize loading state and generate thumbnails for this page
+      const pageLoading = {};
+      response.data.forEach(video => {
+        if (!video.thumbnail_url || video.thumbnail_url === 'http://localhost:5173/placeholder.png') {
+          pageLoading[video.video_id] = true;
+          generateThumbnail(video.video_id, video.summary);
+        }
+      });
+      setLoadingThumbnails(prev => ({ ...prev, ...pageLoading }));
+    } catch (err) {
+      console.error('Error fetching videos:', err);
+      setError('Failed to load videos. Please try again later.');
+    }
+    setLoadingMore(false);
+  };
+
+  useEffect(() => {
     fetchVideos();
   }, []);
 
@@ -117,8 +131,6 @@ const GalleryPage = () => {
                 to={`/feedback/${video.video_id}`}
                 state={{
                   video_path: video.video_path,
-                  advice: video.advice,
-                  chapters: video.chapters,
                   summary: video.summary
                 }}
                 className="bg-white p-4 rounded-lg shadow-lg hover:scale-105 transition-all"
@@ -169,6 +181,18 @@ const GalleryPage = () => {
             </p>
           )}
         </div>
+        {nextCursor && (
+          <div className="flex justify-center mt-8">
+            <button
+              onClick={() => fetchVideos(nextCursor)}
+              disabled={loadingMore}
+              className="bg-fortnite-yellow text-black px-6 py-2 rounded disabled:opacity-50"
+              style={{ fontFamily: "'Luckiest Guy', sans-serif" }}
+            >
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
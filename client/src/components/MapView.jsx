@@ -116,8 +116,17 @@ const MapView = () => {
     const fetchVideos = async () => {
       try {
         console.log('Fetching videos for MapView');
-        const response = await axios.get('http://localhost:5000/api/videos');
-        setVideos(response.data);
+        // Only ids are needed up front, the chosen video is fetched in full on click
+        const ids = [];
+        let cursor = null;
+        do {
+          const params = { fields: 'video_id', limit: 200 };
+          if (cursor) params.cursor = cursor;
+          const response = await axios.get('http://localhost:5000/api/videos', { params });
+          ids.push(...response.data);
+          cursor = response.headers['x-next-cursor'];
+        } while (cursor);
+        setVideos(ids);
       } catch (err) {
         console.error('Error fetching videos in MapView:', err);
       }
@@ -126,13 +135,19 @@ const MapView = () => {
   }, []);
 
   // Handle chest click to navigate to a random video
-  const handleChestClick = () => {
+  const handleChestClick = async () => {
     if (videos.length === 0) {
       window.alert('No videos available! Upload a clip to get started.');
       return;
     }
     const randomIndex = Math.floor(Math.random() * videos.length);
-    const randomVideo = videos[randomIndex];
+    let randomVideo;
+    try {
+      randomVideo = (await axios.get(`http://localhost:5000/api/videos/${videos[randomIndex].video_id}`)).data;
+    } catch (err) {
+      console.error('Error fetching video in MapView:', err);
+      return;
+    }
     navigate(`/feedback/${randomVideo.video_id}`, {
       state: {
         video_path: randomVideo.video_path,
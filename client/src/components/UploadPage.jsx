@@ -5,7 +5,10 @@ import axios from 'axios';
 const UploadPage = () => {
   const [file, setFile] = useState(null);
   const [url, setUrl] = useState('');
+  const [force, setForce] = useState(false);
   const [error, setError] = useState(null);
+  const [jobStatus, setJobStatus] = useState(null);
+  const [partial, setPartial] = useState({});
   const navigate = useNavigate();
 
   const handleFileChange = (e) => {
@@ -18,9 +21,28 @@ const UploadPage = () => {
     setError(null);
   };
 
+  // Follow a background ingest job over Server-Sent Events until it finishes
+  const waitForJob = (jobId) => new Promise((resolve, reject) => {
+    const events = new EventSource(`http://localhost:5000/api/jobs/${jobId}/events`);
+    events.addEventListener('job', (event) => {
+      const job = JSON.parse(event.data);
+      setJobStatus(job.progress ? `${job.status} (${job.progress})` : job.status);
+      setPartial(job.partial || {});
+      if (job.status === 'done' || job.status === 'failed') {
+        events.close();
+        resolve(job);
+      }
+    });
+    events.onerror = () => {
+      events.close();
+      reject(new Error('Lost connection to job progress stream'));
+    };
+  });
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     setError(null);
+    setPartial({});
     try {
       console.log('Sending request to backend');
       const formData = new FormData();
@@ -32,23 +54,38 @@ const UploadPage = () => {
         setError('Please select a file or enter a URL');
         return;
       }
+      if (force) {
+        formData.append('force', 'true');
+      }
 
       const response = await axios.post('http://localhost:5000/api/upload', formData, {
         headers: { 'Content-Type': file ? 'multipart/form-data' : 'application/x-www-form-urlencoded' },
-        timeout: 600000, // 10 minutes
       });
       console.log('Received response:', response.data);
+      setJobStatus(response.data.status);
+
+      // Indexing runs in the background, duplicates of indexed clips come back already done
+      let job = response.data;
+      if (job.status !== 'done') {
+        job = await waitForJob(job.job_id);
+      }
+      if (job.status === 'failed') {
+        setJobStatus(null);
+        setError(job.error || 'Failed to process video.');
+        return;
+      }
 
-      navigate(`/feedback/${response.data.video_id}`, {
+      navigate(`/feedback/${job.result.video_id}`, {
         state: {
-          video_path: response.data.video_path,
-          advice: response.data.advice,
-          chapters: response.data.chapters,
-          summary: response.data.summary
+          video_path: job.result.video_path,
+          advice: job.result.advice,
+          chapters: job.result.chapters,
+          summary: job.result.summary
         }
       });
     } catch (err) {
       console.error('Upload error:', err);
+      setJobStatus(null);
       setError('Failed to upload video. Ensure it meets requirements (360p-4K, 4s-60min, <2GB, audio track).');
     }
   };
@@ -92,6 +129,34 @@ const UploadPage = () => {
             style={{ fontFamily: "'Luckiest Guy', sans-serif" }}
           />
         </div>
+        <div className="mb-4">
+          <label className="text-black" style={{ fontFamily: "'Luckiest Guy', sans-serif" }}>
+            <input
+              type="checkbox"
+              checked={force}
+              onChange={(e) => setForce(e.target.checked)}
+              className="mr-2"
+            />
+            Re-analyze even if this clip was uploaded before
+          </label>
+        </div>
+        {jobStatus && (
+          <p className="text-black mb-4" style={{ fontFamily: "'Luckiest Guy', sans-serif" }}>
+            Status: {jobStatus}
+          </p>
+        )}
+        {partial.summary && (
+          <p className="text-gray-700 text-sm mb-4">
+            {partial.summary}
+          </p>
+        )}
+        {partial.advice && (
+          <ul className="text-gray-700 text-sm mb-4 list-disc pl-4">
+            {(partial.advice.good || []).concat(partial.advice.bad || []).map((item, index) => (
+              <li key={index}>{item}</li>
+            ))}
+          </ul>
+        )}
         {error && (
           <p className="text-red-500 mb-4" style={{ fontFamily: "'Luckiest Guy', sans-serif" }}>
             {error}
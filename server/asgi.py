@@ -0,0 +1,420 @@
+"""Async serving mode: ``uvicorn asgi:app --port 5000`` from this directory.
+
+Serves the same routes, storage and background work as server.py (which
+stays the Flask entry point) on one event loop. Idle connections, job
+progress streams and file downloads cost no thread. Blocking SDK, SQLite
+writes and image work run on a bounded pool of worker threads, so a single
+process can hold hundreds of concurrent chats and polls.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from functools import partial
+
+import anyio
+import httpx
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.security import safe_join
+
+import assets
+import server
+import telemetry
+from content_store import HashingRequest, HashingSpoolFile, discard_upload
+from jobs import TERMINAL_STATES
+from streaming import SSE_HEADERS, sse
+
+# Worker threads for blocking calls; most of them spend their time waiting on Twelve Labs or Gemini
+BLOCKING_WORKERS = int(os.getenv("ASGI_BLOCKING_WORKERS", "256"))
+# Keep-alive connections to Twelve Labs, shared by all worker threads
+TL_MAX_CONNECTIONS = int(os.getenv("TL_MAX_CONNECTIONS", str(BLOCKING_WORKERS)))
+
+job_changed = None  # asyncio.Event, replaced after each job update
+job_watches = {}  # job_id -> JobWatch, while an SSE stream follows the job
+log = logging.getLogger("asgi")
+
+
+async def blocking(fn, *args, **kwargs):
+    return await anyio.to_thread.run_sync(partial(fn, *args, **kwargs))
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("if-none-match", "")
+    return header.strip() == "*" or f'"{etag}"' in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+class TelemetryMiddleware:
+    """Request metrics and X-Request-ID handling, as the request hooks in server.py do for Flask."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        trace_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or telemetry.new_trace_id()
+        token = telemetry.trace_id_var.set(trace_id)
+        started = time.perf_counter()
+        status = None
+
+        def record(code):
+            # The router leaves the matched endpoint in the scope; its name matches the Flask endpoint
+            route = getattr(scope.get("endpoint"), "__name__", "unmatched")
+            telemetry.http_requests.inc(method=scope["method"], route=route, status=code)
+            telemetry.http_duration.observe(time.perf_counter() - started, method=scope["method"], route=route)
+
+        async def send_with_telemetry(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                record(status)
+                message = {**message, "headers": [*message.get("headers", []), (b"x-request-id", trace_id.encode("latin-1"))]}
+            await send(message)
+
+        telemetry.http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_telemetry)
+        except Exception:
+            if status is None:
+                # Turned into a 500 by Starlette's outermost error middleware
+                record(500)
+            raise
+        finally:
+            telemetry.http_in_flight.dec()
+            telemetry.trace_id_var.reset(token)
+
+
+class HashingMultiPartParser(MultiPartParser):
+    """Multipart parser that spools file parts through HashingSpoolFile, as HashingRequest does for Flask."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spools = []
+
+    def on_headers_finished(self):
+        super().on_headers_finished()
+        upload = self._current_part.file
+        if upload is not None:
+            upload.file.close()
+            upload.file = HashingSpoolFile(HashingRequest.upload_dir)
+            self.spools.append(upload.file)
+
+    def discard_spools(self):
+        """Remove spooled parts that were not committed, once the request is done with them."""
+        for spool in self.spools:
+            discard_upload(spool)
+
+
+async def upload_video(request):
+    log.info("Received upload request")
+    parser = None
+    try:
+        with telemetry.span("upload.receive"):
+            if request.headers.get("content-type", "").startswith("multipart/form-data"):
+                parser = HashingMultiPartParser(request.headers, request.stream())
+                form = await parser.parse()
+            else:
+                form = await request.form()
+        force = (form.get("force") or request.query_params.get("force", "")).lower() == "true"
+        upload = form.get("file")
+        if isinstance(upload, UploadFile):
+            payload, status = await blocking(server.queue_upload, spool=upload.file, original_filename=upload.filename, force=force)
+        elif form.get("url"):
+            payload, status = await blocking(server.queue_upload, url=form["url"], force=force)
+        else:
+            log.warning("No file or URL provided")
+            return JSONResponse({"error": "No file or URL provided"}, 400)
+        return JSONResponse(payload, status)
+    except MultiPartException as e:
+        return JSONResponse({"error": e.message}, 400)
+    except Exception as e:
+        log.exception("Error in upload_video: %s", e)
+        return JSONResponse({"error": f"{str(e)}. Ensure your video meets requirements (360p-4K, 4s-60min, <2GB, audio track)."}, 500)
+    finally:
+        # Parts queue_upload did not commit (bad field names, errors, aborted bodies)
+        if parser is not None:
+            parser.discard_spools()
+
+
+async def get_job(request):
+    job = await blocking(server.jobs.get, request.path_params["job_id"])
+    if not job:
+        return JSONResponse({"error": f"Unknown job {request.path_params['job_id']}"}, 404)
+    return JSONResponse(job)
+
+
+class JobWatch:
+    """One job as followed by its SSE streams.
+
+    A single poller per job re-reads it (on a worker thread) after each job
+    update in this process and every second for updates made by other
+    processes, so the number of open streams doesn't multiply the queries.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.changed = asyncio.Event()  # replaced after each change
+        self.streams = 0
+        self.poller = asyncio.create_task(self.poll())
+
+    async def poll(self):
+        while self.job["status"] not in TERMINAL_STATES:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(job_changed.wait(), 1.0)
+            job = await blocking(server.jobs.get, self.job["job_id"])
+            if job is None:
+                return
+            if job["updated_at"] > self.job["updated_at"]:
+                self.job = job
+                self.changed.set()
+                self.changed = asyncio.Event()
+
+    async def wait_for_update(self, updated_at, timeout):
+        """The job once it changes after ``updated_at``, or None on timeout."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self.job["updated_at"] <= updated_at:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return None
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.changed.wait(), remaining)
+        return self.job
+
+
+@contextlib.contextmanager
+def watch_job(job):
+    watch = job_watches.get(job["job_id"])
+    if watch is None:
+        watch = job_watches[job["job_id"]] = JobWatch(job)
+    watch.streams += 1
+    try:
+        yield watch
+    finally:
+        watch.streams -= 1
+        if not watch.streams:
+            watch.poller.cancel()
+            del job_watches[job["job_id"]]
+
+
+async def job_events(request):
+    job_id = request.path_params["job_id"]
+    job = await blocking(server.jobs.get, job_id)
+    if not job:
+        return JSONResponse({"error": f"Unknown job {job_id}"}, 404)
+
+    async def stream():
+        current = job
+        yield sse("job", current)
+        with watch_job(job) as watch:
+            while current["status"] not in TERMINAL_STATES:
+                changed = await watch.wait_for_update(current["updated_at"], timeout=15)
+                if changed is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                current = changed
+                yield sse("job", current)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+async def get_videos(request):
+    try:
+        etag = await blocking(server.catalog_etag, request.url.query)
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+        telemetry.cache_lookup("catalog_etag", etag_matches(request, etag))
+        if etag_matches(request, etag):
+            response = Response(status_code=304, headers=headers)
+        else:
+            cursor = int(request.query_params.get("cursor") or 0)
+            limit = server.page_limit(int(request.query_params.get("limit") or 0))
+            fields = [f for f in request.query_params.get("fields", "").split(",") if f]
+            videos, next_cursor = await blocking(server.catalog.page, after=cursor, limit=limit)
+            if next_cursor is not None:
+                headers["X-Next-Cursor"] = str(next_cursor)
+            response = JSONResponse([server.project(video, fields) for video in videos], headers=headers)
+        if await blocking(server.catalog.get_meta, "index_sync") is None:
+            server.index_reconciler.trigger()
+        return response
+    except Exception as e:
+        log.exception("Error in get_videos: %s", e)
+        return JSONResponse({"error": str(e)}, 500)
+
+
+async def get_video(request):
+    video = await blocking(server.catalog.get, request.path_params["video_id"])
+    if not video:
+        return JSONResponse({"error": f"Unknown video {request.path_params['video_id']}"}, 404)
+    return JSONResponse(video)
+
+
+async def search(request):
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return JSONResponse({"error": "Missing q"}, 400)
+
+    def number(name, cast):
+        try:
+            return cast(request.query_params[name])
+        except (KeyError, ValueError):
+            return None
+
+    return JSONResponse(await blocking(
+        server.search_catalog,
+        query,
+        limit=number("limit", int) or 20,
+        video_id=request.query_params.get("video_id"),
+        start=number("start", float),
+        end=number("end", float),
+    ))
+
+
+async def trigger_sync(request):
+    server.index_reconciler.trigger()
+    last_sync = await blocking(server.catalog.get_meta, "index_sync")
+    return JSONResponse({"sync": server.index_reconciler.status(), "last_sync": last_sync}, 202)
+
+
+async def serve_video(request):
+    """Same caching rules as the Flask route; Range requests are handled by FileResponse."""
+    filename = request.path_params["filename"]
+    path = safe_join("uploads", filename)
+    if not path or not os.path.isfile(path):
+        return JSONResponse({"error": f"File not found: {filename}"}, 404)
+
+    resizable = assets.is_resizable(filename)
+    served_path = path
+    if resizable:
+        width = request.query_params.get("w")
+        served_path = await blocking(assets.pick_variant, path, width=int(width) if width and width.isdigit() else None,
+                                     accept_webp="image/webp" in request.headers.get("accept", ""))
+
+    etag = await blocking(assets.etag, served_path)
+    headers = {"ETag": f'"{etag}"'}
+    if await blocking(assets.is_immutable, filename, path, request.query_params.get("v")):
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        headers["Cache-Control"] = "no-cache"
+    if resizable:
+        headers["Vary"] = "Accept"
+    telemetry.cache_lookup("uploads_etag", etag_matches(request, etag))
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(served_path, headers=headers)
+
+
+async def chat(request):
+    try:
+        video_id, message, summary, error = server.parse_chat_request(await request.json())
+        if error:
+            return JSONResponse(*error)
+        return JSONResponse(await blocking(server.complete_chat, video_id, message, summary))
+    except Exception as e:
+        log.exception("Error in chat: %s", e)
+        return JSONResponse({"error": f"Chat error: {str(e)}"}, 500)
+
+
+async def chat_stream(request):
+    video_id, message, summary, error = server.parse_chat_request(await request.json())
+    if error:
+        return JSONResponse(*error)
+    # The SDK stream is blocking, so each chunk is read on a worker thread
+    return StreamingResponse(iterate_in_threadpool(telemetry.bind_iter(server.chat_events(video_id, message, summary))),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+async def generate_image(request):
+    try:
+        data = await request.json()
+        video_id = data.get("video_id")
+
+        if not video_id:
+            log.warning("Missing video_id")
+            return JSONResponse({"error": "Missing video_id"}, 400)
+
+        return JSONResponse(await blocking(server.refresh_thumbnail, video_id, data.get("summary", "Fortnite gameplay"),
+                                           force=data.get("force")))
+    except Exception as e:
+        log.exception("Error in generate_image: %s", e)
+        return JSONResponse({"error": str(e), "image_url": "http://localhost:5173/placeholder.png"}, 500)
+
+
+async def metrics(request):
+    # Some gauges are read from the catalog at scrape time
+    return Response(await blocking(telemetry.render), headers={"Content-Type": telemetry.CONTENT_TYPE})
+
+
+async def get_trace(request):
+    trace_id = request.path_params["trace_id"]
+    spans = telemetry.spans_for(trace_id)
+    if not spans:
+        return JSONResponse({"error": f"Unknown trace {trace_id}"}, 404)
+    return JSONResponse({"trace_id": trace_id, "spans": sorted(spans, key=lambda span: span["start"])})
+
+
+def pool_twelvelabs_connections(client):
+    """Give the Twelve Labs SDK's shared HTTP client a keep-alive pool as large as the worker pool."""
+    http = getattr(client, "_client", None)
+    if not isinstance(http, httpx.Client):
+        return
+    limits = httpx.Limits(max_connections=TL_MAX_CONNECTIONS, max_keepalive_connections=TL_MAX_CONNECTIONS)
+    client._client = httpx.Client(base_url=http.base_url, headers=http.headers, timeout=http.timeout, limits=limits)
+    http.close()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global job_changed
+    loop = asyncio.get_running_loop()
+    job_changed = asyncio.Event()
+
+    def wake_job_waiters():
+        global job_changed
+        job_changed.set()
+        job_changed = asyncio.Event()
+
+    def on_job_update():
+        # JobStore.update runs on ingest threads
+        loop.call_soon_threadsafe(wake_job_waiters)
+
+    anyio.to_thread.current_default_thread_limiter().total_tokens = BLOCKING_WORKERS
+    pool_twelvelabs_connections(server.client)
+    server.jobs.listeners.append(on_job_update)
+    await blocking(server.start_background_work)
+    yield
+    server.jobs.listeners.remove(on_job_update)
+
+
+routes = [
+    Route("/api/upload", upload_video, methods=["POST"]),
+    Route("/api/jobs/{job_id}", get_job, methods=["GET"]),
+    Route("/api/jobs/{job_id}/events", job_events, methods=["GET"]),
+    Route("/api/videos", get_videos, methods=["GET"]),
+    Route("/api/videos/sync", trigger_sync, methods=["POST"]),
+    Route("/api/videos/{video_id}", get_video, methods=["GET"]),
+    Route("/api/search", search, methods=["GET"]),
+    Route("/uploads/{filename:path}", serve_video, methods=["GET"]),
+    Route("/api/chat", chat, methods=["POST"]),
+    Route("/api/chat/stream", chat_stream, methods=["POST"]),
+    Route("/api/generate-image", generate_image, methods=["POST"]),
+    Route("/metrics", metrics, methods=["GET"]),
+    Route("/api/traces/{trace_id}", get_trace, methods=["GET"]),
+]
+
+app = Starlette(
+    routes=routes,
+    lifespan=lifespan,
+    middleware=[
+        Middleware(TelemetryMiddleware),
+        Middleware(CORSMiddleware, allow_origins=["http://localhost:5173"], allow_methods=["*"],
+                   allow_headers=["*"], expose_headers=["ETag", "X-Next-Cursor", "X-Request-ID"]),
+    ],
+)
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import re
+import threading
+
+from PIL import Image
+
+import telemetry
+
+VARIANT_WIDTHS = (160, 320, 400)
+VARIANT_FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}), "jpg": ("JPEG", {"quality": 82, "optimize": True})}
+RESIZABLE_PREFIXES = ("thumbnail_", "poster_")
+# Uploads and their preprocessed copies, e.g. <sha256>.mp4 and <sha256>-720p.mp4
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}(-[a-z0-9]+)*\.[a-z0-9]+$")
+
+# Larger files that aren't content-addressed (videos synced from the index) get a stat-based validator
+ETAG_HASH_LIMIT = int(os.getenv("ETAG_HASH_LIMIT", str(32 * 1024 * 1024)))
+
+_etags = {}  # path -> (mtime_ns, size, sha256 hex), one entry per file
+_etag_lock = threading.Lock()
+_variant_lock = threading.Lock()
+
+
+def etag(path):
+    """Strong ETag for a file.
+
+    Content-addressed uploads already carry their hash in the name. Other
+    files are hashed (SHA-256) once per (mtime, size), unless they are over
+    ETAG_HASH_LIMIT, which get mtime and size instead of a full read.
+    """
+    name = os.path.basename(path)
+    if CONTENT_ADDRESSED.match(name):
+        return os.path.splitext(name)[0]
+    stat = os.stat(path)
+    if stat.st_size > ETAG_HASH_LIMIT:
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    with _etag_lock:
+        cached = _etags.get(path)
+    hit = cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size)
+    telemetry.cache_lookup("asset_etag", hit)
+    if hit:
+        return cached[2]
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    digest = sha256.hexdigest()
+    with _etag_lock:
+        # Replaces the entry for the file's previous version
+        _etags[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def versioned_url(base_url, path):
+    """URL for ``path`` carrying a content version, so it can be cached as immutable."""
+    return f"{base_url}/{path}?v={etag(path)[:16]}"
+
+
+def is_resizable(filename):
+    return os.path.basename(filename).startswith(RESIZABLE_PREFIXES)
+
+
+def is_immutable(filename, path, version):
+    """Content-addressed uploads never change; other files only when requested with their current version."""
+    if CONTENT_ADDRESSED.match(os.path.basename(filename)):
+        return True
+    return bool(version) and etag(path).startswith(version)
+
+
+def _variant_path(path, width, ext):
+    directory, name = os.path.split(path)
+    stem = os.path.splitext(name)[0]
+    return os.path.join(directory, "variants", f"{stem}-{width}.{ext}")
+
+
+def make_variants(path):
+    """Write WebP and JPEG copies of an image at each of VARIANT_WIDTHS (never upscaled)."""
+    with _variant_lock, telemetry.span("assets.make_variants"):
+        with Image.open(path) as image:
+            image = image.convert("RGB")
+            os.makedirs(os.path.join(os.path.dirname(path), "variants"), exist_ok=True)
+            for width in VARIANT_WIDTHS:
+                resized = image
+                if image.width > width:
+                    resized = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+                for ext, (fmt, options) in VARIANT_FORMATS.items():
+                    target = _variant_path(path, width, ext)
+                    tmp = f"{target}.tmp"
+                    resized.save(tmp, fmt, **options)
+                    os.replace(tmp, target)
+
+
+def pick_variant(path, width=None, accept_webp=False):
+    """Path of the variant to serve for a request, generating variants if they are missing or stale."""
+    chosen = next((w for w in VARIANT_WIDTHS if width and w >= width), VARIANT_WIDTHS[-1])
+    variant = _variant_path(path, chosen, "webp" if accept_webp else "jpg")
+    try:
+        stale = os.stat(variant).st_mtime_ns < os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        stale = True
+    if stale:
+        make_variants(path)
+    return variant
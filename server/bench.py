@@ -0,0 +1,306 @@
+"""Load test for the API, run against the offline fake backends in fakes.py.
+
+    python bench.py --serve asgi --duration 20 --concurrency 50
+    python bench.py --serve flask --mix gallery=60,chat=40 --json before.json
+    python bench.py --url http://localhost:5000 --pid 1234
+
+With ``--serve`` the server is started from a scratch directory seeded with
+videos.json and ``FAKE_BACKENDS=true``, so the real catalog and uploads are
+never touched. ``FAKE_*`` variables are passed through to tune the fakes.
+Each scenario in the mix runs alone, then all of them together. For every
+endpoint the report gives latency percentiles and throughput, and for every
+phase the server's peak RSS (children included).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+import psutil
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MIX = "gallery=35,search=15,chat=20,chat_stream=15,generate_image=5,upload=10"
+SEARCH_QUERIES = ["bad positioning in storm", "build fight", "high ground", "rotation", "sniper shot", "heal shield"]
+JOB_POLL_INTERVAL = 0.25
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)  # endpoint -> [seconds]
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, seconds, ok):
+        self.latencies[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            endpoints[endpoint] = {
+                "count": len(values),
+                "errors": self.errors[endpoint],
+                "throughput": round(len(values) / elapsed, 2),
+                **{f"p{p}_ms": round(percentile(values, p) * 1000, 1) for p in (50, 95, 99)},
+            }
+        return endpoints
+
+
+class RssSampler:
+    """Peak resident memory of a process and its children, sampled in the background."""
+
+    def __init__(self, pid, interval=0.1):
+        self.process = psutil.Process(pid) if pid else None
+        self.interval = interval
+        self.peak = 0
+
+    def sample(self):
+        total = 0
+        for process in [self.process] + self.process.children(recursive=True):
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        self.peak = max(self.peak, total)
+
+    async def run(self):
+        while self.process:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+
+class Workload:
+    """One virtual user's view of the API: each scenario is a short sequence of requests."""
+
+    def __init__(self, client, recorder, videos, video_file):
+        self.client = client
+        self.recorder = recorder
+        self.videos = videos
+        self.video_file = video_file
+        self.etag = None
+
+    async def request(self, endpoint, method, url, **kwargs):
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            return response
+        except httpx.HTTPError:
+            return None
+        finally:
+            ok = response is not None and response.status_code < 400
+            self.recorder.record(endpoint, time.perf_counter() - started, ok)
+
+    def video(self):
+        return random.choice(self.videos)
+
+    async def gallery(self):
+        # Half of the visits revalidate a cached listing, like a browser reload
+        headers = {"If-None-Match": self.etag} if self.etag and random.random() < 0.5 else {}
+        response = await self.request("GET /api/videos", "GET", "/api/videos", headers=headers)
+        if response is not None and response.headers.get("ETag"):
+            self.etag = response.headers["ETag"]
+        await self.request("GET /api/videos/<id>", "GET", f"/api/videos/{self.video()['video_id']}")
+
+    async def search(self):
+        await self.request("GET /api/search", "GET", "/api/search", params={"q": random.choice(SEARCH_QUERIES)})
+
+    async def chat(self):
+        video = self.video()
+        await self.request("POST /api/chat", "POST", "/api/chat",
+                           json={"video_id": video["video_id"], "message": "How was my build fight?", "summary": video["summary"]})
+
+    async def chat_stream(self):
+        video = self.video()
+        body = {"video_id": video["video_id"], "message": "What should I practice?", "summary": video["summary"]}
+        started = time.perf_counter()
+        first_token = None
+        ok = False
+        try:
+            async with self.client.stream("POST", "/api/chat/stream", json=body) as response:
+                async for line in response.aiter_lines():
+                    if first_token is None and line == "event: token":
+                        first_token = time.perf_counter() - started
+                    if line == "event: done":
+                        ok = True
+        except httpx.HTTPError:
+            pass
+        self.recorder.record("POST /api/chat/stream", time.perf_counter() - started, ok)
+        if first_token is not None:
+            self.recorder.record("POST /api/chat/stream (first token)", first_token, True)
+
+    async def generate_image(self):
+        video = self.video()
+        # force skips the cached thumbnail, so this measures the Gemini path
+        await self.request("POST /api/generate-image", "POST", "/api/generate-image",
+                           json={"video_id": video["video_id"], "summary": video["summary"], "force": True})
+
+    async def upload(self):
+        started = time.perf_counter()
+        with open(self.video_file, "rb") as f:
+            # force bypasses content deduplication, so every upload runs a full ingest
+            response = await self.request("POST /api/upload", "POST", "/api/upload",
+                                          data={"force": "true"}, files={"file": ("bench.mp4", f, "video/mp4")})
+        if response is None or response.status_code >= 400:
+            return
+        job_id = response.json()["job_id"]
+        status = response.json()["status"]
+        while status not in ("done", "failed"):
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            response = await self.request("GET /api/jobs/<id>", "GET", f"/api/jobs/{job_id}")
+            if response is None:
+                return
+            status = response.json()["status"]
+        self.recorder.record("ingest (upload to done)", time.perf_counter() - started, status == "done")
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if not hasattr(Workload, name.strip()):
+            raise SystemExit(f"Unknown scenario {name!r}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def run_phase(url, mix, concurrency, duration, videos, video_file, pid):
+    recorder = Recorder()
+    sampler = RssSampler(pid)
+    names, weights = zip(*mix.items())
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        async def user():
+            workload = Workload(client, recorder, videos, video_file)
+            while time.perf_counter() < deadline:
+                await getattr(workload, random.choices(names, weights)[0])()
+
+        sampling = asyncio.create_task(sampler.run())
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        sampling.cancel()
+    return {
+        "scenarios": dict(mix),
+        "elapsed": round(elapsed, 2),
+        "peak_rss_mb": round(sampler.peak / 1024 ** 2, 1) if pid else None,
+        "endpoints": recorder.summary(elapsed),
+    }
+
+
+def print_phase(name, result, concurrency):
+    rss = f", peak RSS {result['peak_rss_mb']} MB" if result["peak_rss_mb"] is not None else ""
+    print(f"\n== {name} ({concurrency} users, {result['elapsed']}s{rss})")
+    print(f"{'endpoint':<40}{'count':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in result["endpoints"].items():
+        print(f"{endpoint:<40}{stats['count']:>7}{stats['errors']:>8}{stats['throughput']:>9}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+def make_test_video(path):
+    """A short clip that passes upload validation (360p, with an audio track), made with the bundled ffmpeg."""
+    import imageio_ffmpeg
+
+    subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+                    "-f", "lavfi", "-i", "testsrc2=size=640x360:rate=30:duration=8",
+                    "-f", "lavfi", "-i", "sine=frequency=440:duration=8",
+                    "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-shortest", path], check=True)
+    return path
+
+
+def start_server(mode, port, workdir):
+    shutil.copy(os.path.join(SERVER_DIR, "videos.json"), workdir)
+    env = {**os.environ, "FAKE_BACKENDS": "true", "PORT": str(port),
+           "PYTHONPATH": os.pathsep.join(filter(None, [SERVER_DIR, os.environ.get("PYTHONPATH")]))}
+    if mode == "flask":
+        command = [sys.executable, os.path.join(SERVER_DIR, "server.py")]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port), "--log-level", "warning"]
+    log = open(os.path.join(workdir, "server.log"), "w")
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited, see {log.name}")
+        try:
+            if httpx.get(f"{url}/api/videos?limit=1", timeout=2).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"Server did not start, see {log.name}")
+
+
+def stop_server(process):
+    parent = psutil.Process(process.pid)
+    for child in parent.children(recursive=True):
+        child.kill()
+    parent.kill()
+    process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--serve", choices=["flask", "asgi"], help="start a server on fake backends")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="server to test when not using --serve")
+    parser.add_argument("--pid", type=int, help="server process to measure RSS of when not using --serve")
+    parser.add_argument("--port", type=int, default=5077)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight,... (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=15, help="seconds per phase")
+    parser.add_argument("--no-isolated", action="store_true", help="only run the mixed phase")
+    parser.add_argument("--video", help="file for upload scenarios (default: generated test clip)")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    process = None
+    try:
+        url, pid = args.url, args.pid
+        if args.serve:
+            process, url = start_server(args.serve, args.port, workdir)
+            pid = process.pid
+        video_file = args.video
+        if "upload" in mix and not video_file:
+            video_file = make_test_video(os.path.join(workdir, "bench.mp4"))
+        videos = httpx.get(f"{url}/api/videos", params={"fields": "video_id,summary"}, timeout=30).json()
+        if not videos:
+            raise SystemExit("The catalog is empty, nothing to benchmark against")
+
+        phases = [] if args.no_isolated or len(mix) == 1 else [(name, {name: 1}) for name in mix]
+        phases.append(("mixed" if len(mix) > 1 else next(iter(mix)), mix))
+        results = {"server": args.serve or url, "concurrency": args.concurrency, "duration": args.duration,
+                   "fake_env": {k: v for k, v in os.environ.items() if k.startswith("FAKE_")}, "phases": {}}
+        for name, phase_mix in phases:
+            result = asyncio.run(run_phase(url, phase_mix, args.concurrency, args.duration, videos, video_file, pid))
+            results["phases"][name] = result
+            print_phase(name, result, args.concurrency)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        if process:
+            stop_server(process)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import telemetry
+
+
+class ChatSessionStore:
+    """Per-video chat sessions with a fixed prompt budget, persisted in SQLite.
+
+    Each session keeps its last ``max_turns`` turns verbatim. Older turns are
+    folded into a running text summary capped at ``summary_chars``, so the
+    history sent with each prompt stays the same size however long the chat
+    runs. At most ``cache_size`` sessions are held in memory (LRU), sessions
+    idle for ``ttl`` seconds are dropped from memory and, on purge, from disk.
+    """
+
+    def __init__(self, db, max_turns=6, summary_chars=1500, cache_size=256, ttl=7 * 24 * 3600):
+        self.db = db
+        self.max_turns = max_turns
+        self.summary_chars = summary_chars
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()  # video_id -> session, least recently used first
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_sessions ("
+            " video_id TEXT PRIMARY KEY,"
+            " summary TEXT NOT NULL,"
+            " turns TEXT NOT NULL,"
+            " last_active REAL NOT NULL)"
+        )
+
+    def _load(self, video_id, conn=None):
+        """Return a copy of the current session for ``video_id``.
+
+        Other server processes write the same rows, so the stored
+        ``last_active`` is checked on every load and a cached copy older
+        than the row is read again. Only cache access holds self.lock, never
+        a database call.
+        """
+        conn = conn or self.db
+        now = time.time()
+        row = conn.execute("SELECT last_active FROM chat_sessions WHERE video_id = ?", (video_id,)).fetchone()
+        stored = row["last_active"] if row and now - row["last_active"] < self.ttl else None
+        with self.lock:
+            for expired in [v for v, s in self.cache.items() if now - s["last_active"] >= self.ttl]:
+                del self.cache[expired]
+            session = self.cache.get(video_id)
+            hit = session is not None and stored is not None and session["last_active"] >= stored
+            if hit:
+                self.cache.move_to_end(video_id)
+                session = dict(session, turns=list(session["turns"]))
+        telemetry.cache_lookup("chat_session", hit)
+        if hit:
+            return session
+        if stored is None:
+            # Never started, expired or reset (possibly by another process)
+            return {"summary": "", "turns": [], "last_active": now}
+        row = conn.execute(
+            "SELECT summary, turns, last_active FROM chat_sessions WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        session = {"summary": row["summary"], "turns": json.loads(row["turns"]), "last_active": row["last_active"]}
+        self._remember(video_id, session)
+        return session
+
+    def _remember(self, video_id, session):
+        """Cache a copy of ``session`` unless a newer one is already cached."""
+        with self.lock:
+            cached = self.cache.get(video_id)
+            if cached is None or cached["last_active"] <= session["last_active"]:
+                self.cache[video_id] = dict(session, turns=list(session["turns"]))
+            self.cache.move_to_end(video_id)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _save(self, conn, video_id, session):
+        conn.execute(
+            "INSERT INTO chat_sessions (video_id, summary, turns, last_active) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(video_id) DO UPDATE SET summary = excluded.summary, turns = excluded.turns,"
+            " last_active = excluded.last_active",
+            (video_id, session["summary"], json.dumps(session["turns"]), session["last_active"]),
+        )
+
+    def get(self, video_id):
+        session = self._load(video_id)
+        return {"summary": session["summary"], "turns": session["turns"]}
+
+    def prompt_history(self, video_id):
+        """History text for the next prompt: the rolled-up summary plus the recent turns."""
+        session = self.get(video_id)
+        history = json.dumps(session["turns"])
+        if session["summary"]:
+            history = f"(Earlier in this chat: {session['summary']}) {history}"
+        return history
+
+    def append(self, video_id, user, ai):
+        """Record a turn and return the recent turns after compaction."""
+        # The write transaction makes the read-modify-write atomic across threads and server processes
+        with self.db.transaction() as conn:
+            session = self._load(video_id, conn)
+            session["turns"].append({"user": user, "ai": ai})
+            while len(session["turns"]) > self.max_turns:
+                old = session["turns"].pop(0)
+                line = f"Q: {old['user'][:120]} A: {old['ai'][:200]}"
+                summary = f"{session['summary']} | {line}" if session["summary"] else line
+                # Over budget: drop the oldest entries, cutting at an entry boundary where possible
+                if len(summary) > self.summary_chars:
+                    summary = summary[-self.summary_chars:]
+                    summary = summary.split(" | ", 1)[-1]
+                session["summary"] = summary
+            session["last_active"] = time.time()
+            self._save(conn, video_id, session)
+        self._remember(video_id, session)
+        return list(session["turns"])
+
+    def reset(self, video_id):
+        self.db.execute("DELETE FROM chat_sessions WHERE video_id = ?", (video_id,))
+        with self.lock:
+            self.cache.pop(video_id, None)
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        with self.lock:
+            for video_id in [v for v, s in self.cache.items() if s["last_active"] < cutoff]:
+                del self.cache[video_id]
+        return self.db.execute("DELETE FROM chat_sessions WHERE last_active < ?", (cutoff,)).rowcount
+
+    def __len__(self):
+        with self.lock:
+            return len(self.cache)
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from flask import Request
+
+from jobs import TERMINAL_STATES
+
+
+class HashingSpoolFile:
+    """Upload target that SHA-256 hashes the bytes as Werkzeug streams the request body into it.
+
+    The data goes straight to a temp file in the upload directory, so once the
+    hash is known the file can be renamed into place without a second copy.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=directory, prefix=".upload-", delete=False)
+        self.sha256 = hashlib.sha256()
+        self.finished = False  # set once committed or discarded
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class HashingRequest(Request):
+    """Request class that spools multipart file parts through HashingSpoolFile.
+
+    Parts that were not committed by the end of the request are removed by
+    ``discard_spools()``, which the app calls on teardown.
+    """
+
+    upload_dir = "uploads"
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        spool = HashingSpoolFile(self.upload_dir)
+        self.__dict__.setdefault("spools", []).append(spool)
+        return spool
+
+    def discard_spools(self):
+        for spool in self.__dict__.pop("spools", []):
+            discard_upload(spool)
+
+
+def commit_upload(spool, upload_dir, original_filename):
+    """Move a finished spool file to ``<upload_dir>/<sha256><ext>`` and return ``(content_hash, path)``.
+
+    If that content is already on disk the new copy is discarded.
+    """
+    spool.file.close()
+    spool.finished = True
+    content_hash = spool.hexdigest()
+    ext = os.path.splitext(original_filename)[1].lower()
+    if not ext[1:].isalnum():
+        ext = ""
+    path = os.path.join(upload_dir, f"{content_hash}{ext}").replace("\\", "/")
+    if os.path.exists(path):
+        os.remove(spool.file.name)
+    else:
+        os.replace(spool.file.name, path)
+    return content_hash, path
+
+
+def discard_upload(spool):
+    """Remove a spool file unless it was already committed or discarded."""
+    if spool.finished:
+        return
+    spool.file.close()
+    spool.finished = True
+    try:
+        os.remove(spool.file.name)
+    except FileNotFoundError:
+        pass
+
+
+def url_content_hash(url):
+    """Remote videos are keyed by their URL, since their bytes never pass through this server."""
+    return "url:" + hashlib.sha256(url.strip().encode()).hexdigest()
+
+
+class ContentIndex:
+    """Maps upload content hashes to the ingest job and video_id they produced."""
+
+    def __init__(self, db):
+        self.db = db
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS content_hashes ("
+            " content_hash TEXT PRIMARY KEY,"
+            " job_id TEXT,"
+            " video_id TEXT,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def holder(self, content_hash, conn=None):
+        """The hash's entry if a catalog video or an unfinished ingest job holds it, else None."""
+        conn = conn or self.db
+        placeholders = ", ".join("?" for _ in TERMINAL_STATES)
+        row = conn.execute(
+            "SELECT content_hash, job_id, video_id FROM content_hashes h WHERE content_hash = ? AND ("
+            " EXISTS (SELECT 1 FROM videos v WHERE v.video_id = h.video_id) OR"
+            f" EXISTS (SELECT 1 FROM jobs j WHERE j.job_id = h.job_id AND j.status NOT IN ({placeholders})))",
+            (content_hash, *TERMINAL_STATES),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def claim(self, content_hash, job_id, conn=None):
+        """Point a hash at a new ingest job. A video it already resolved to is kept until the job finishes.
+
+        Unconditional: check holder() first in the same write transaction.
+        """
+        (conn or self.db).execute(
+            "INSERT INTO content_hashes (content_hash, job_id, video_id, updated_at) VALUES (?, ?, NULL, ?)"
+            " ON CONFLICT(content_hash) DO UPDATE SET job_id = excluded.job_id, updated_at = excluded.updated_at",
+            (content_hash, job_id, time.time()),
+        )
+
+    def resolve(self, content_hash, job_id, video_id):
+        self.db.execute(
+            "UPDATE content_hashes SET video_id = ?, updated_at = ? WHERE content_hash = ? AND job_id = ?",
+            (video_id, time.time(), content_hash, job_id),
+        )
+
+    def release(self, content_hash, job_id):
+        """Forget a hash whose job failed, so the next upload of that content is retried."""
+        self.db.execute(
+            "DELETE FROM content_hashes WHERE content_hash = ? AND job_id = ? AND video_id IS NULL",
+            (content_hash, job_id),
+        )
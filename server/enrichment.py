@@ -0,0 +1,105 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import telemetry
+
+log = logging.getLogger(__name__)
+
+# A stage still waiting for a worker after this many of its timeouts falls back without running
+QUEUE_TIMEOUT_FACTOR = 3
+
+
+class Stage:
+    """One remote call in an enrichment graph.
+
+    ``fn`` is called with the results of ``deps`` (in order) once they are all
+    resolved. If it raises or runs past ``timeout`` seconds, ``fallback`` is
+    used as its result so the rest of the graph can still finish.
+    """
+
+    def __init__(self, name, fn, deps=(), timeout=None, fallback=None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+def run_stage(stage, started, *args):
+    # The stage's timeout counts from here, not from when it was queued behind other work
+    started[stage.name] = time.time()
+    # Per-video graphs name stages "<video_id>:<stage>"; only the stage part is a metric label
+    with telemetry.span(f"stage.{stage.name.rpartition(':')[2]}", stage=stage.name):
+        return stage.fn(*args)
+
+
+def run_stages(stages, executor, on_stage_done=None, max_in_flight=None):
+    """Run a dependency graph of stages on ``executor`` and return ``{name: result}``.
+
+    Independent stages run concurrently, so the total latency is that of the
+    slowest dependency chain rather than the sum of every call. At most
+    ``max_in_flight`` stages are handed to the executor at a time, leaving the
+    rest of a shared pool to other graphs. A stage's timeout starts once a
+    worker picks it up; one that waits QUEUE_TIMEOUT_FACTOR times its timeout
+    for a worker falls back as well. ``on_stage_done(name, result, error)`` is
+    called as each stage resolves.
+    """
+    pending = {stage.name: stage for stage in stages}
+    results = {}
+    running = {}  # future -> stage
+    submitted = {}  # stage name -> time it was handed to the executor
+    started = {}  # stage name -> time a worker picked it up, written by run_stage
+
+    def resolve(stage, result, error=None):
+        results[stage.name] = result
+        if error is not None:
+            log.warning("Stage %s failed: %s", stage.name, error)
+        if on_stage_done:
+            on_stage_done(stage.name, result, error)
+
+    while pending or running:
+        for name, stage in list(pending.items()):
+            if max_in_flight is not None and len(running) >= max_in_flight:
+                break
+            if all(dep in results for dep in stage.deps):
+                del pending[name]
+                future = executor.submit(telemetry.bind_context(run_stage), stage, started, *[results[dep] for dep in stage.deps])
+                running[future] = stage
+                submitted[name] = time.time()
+
+        if not running:
+            # Remaining stages depend on names that are not in the graph
+            raise ValueError(f"Unresolvable stages: {sorted(pending)}")
+
+        def deadline(stage):
+            if stage.name in started:
+                return started[stage.name] + stage.timeout
+            return submitted[stage.name] + stage.timeout * QUEUE_TIMEOUT_FACTOR
+
+        # A stage picked up during the wait can't expire before its full timeout, so this bounds the wait too
+        now = time.time()
+        deadlines = [min(deadline(stage), now + stage.timeout) for stage in running.values() if stage.timeout]
+        wait_for = max(0, min(deadlines) - now) if deadlines else None
+        done, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            stage = running.pop(future)
+            try:
+                resolve(stage, future.result())
+            except Exception as e:
+                resolve(stage, stage.fallback, e)
+
+        now = time.time()
+        for future, stage in list(running.items()):
+            if stage.timeout and now >= deadline(stage):
+                # A running worker thread keeps going, but its result is no longer waited on
+                del running[future]
+                if stage.name in started:
+                    error = TimeoutError(f"timed out after {stage.timeout}s")
+                else:
+                    future.cancel()
+                    error = TimeoutError(f"no worker free after {stage.timeout * QUEUE_TIMEOUT_FACTOR}s")
+                resolve(stage, stage.fallback, error)
+
+    return results
@@ -0,0 +1,211 @@
+"""Local stand-ins for the Twelve Labs and Gemini clients, so the server can be run and benchmarked offline.
+
+Enabled in server.py with ``FAKE_BACKENDS=true``. Only the client surface
+the server uses is implemented, returning objects of the same shape. Tuned
+with environment variables:
+
+- ``FAKE_LATENCY``: mean seconds per remote call (default 0.5), jittered by +-50%
+- ``FAKE_FAILURE_RATE``: probability that a call raises (default 0)
+- ``FAKE_INDEXING_SECONDS``: time an upload takes to become ready (default 5)
+- ``FAKE_SUMMARY_WORDS``, ``FAKE_RESPONSE_WORDS``, ``FAKE_CHAPTERS``, ``FAKE_ADVICE_ITEMS``: text payload sizes
+- ``FAKE_STREAM_CHUNK_WORDS``, ``FAKE_STREAM_INTERVAL``: streamed chat chunk size and spacing
+- ``FAKE_IMAGE_SIZE``: side of generated images in pixels (default 1024)
+- ``FAKE_INDEX_VIDEOS``: videos listed by ``index.video.list`` (default 0)
+- ``FAKE_SEED``: seed for payloads and jitter
+"""
+import base64
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from io import BytesIO
+from types import SimpleNamespace
+
+from PIL import Image
+
+WORDS = (
+    "storm circle build edit ramp wall cone box fight shotgun sniper rifle heal shield loot chest "
+    "rotation high ground zone push third party elimination launch pad bridge tower peek reload "
+    "positioning awareness materials wood brick metal squad duo solo victory royale late game"
+).split()
+
+
+class FakeBackendError(Exception):
+    pass
+
+
+class FakeSettings:
+    def __init__(self):
+        self.latency = float(os.getenv("FAKE_LATENCY", "0.5"))
+        self.failure_rate = float(os.getenv("FAKE_FAILURE_RATE", "0"))
+        self.indexing_seconds = float(os.getenv("FAKE_INDEXING_SECONDS", "5"))
+        self.summary_words = int(os.getenv("FAKE_SUMMARY_WORDS", "300"))
+        self.response_words = int(os.getenv("FAKE_RESPONSE_WORDS", "80"))
+        self.chapters = int(os.getenv("FAKE_CHAPTERS", "5"))
+        self.advice_items = int(os.getenv("FAKE_ADVICE_ITEMS", "5"))
+        self.stream_chunk_words = int(os.getenv("FAKE_STREAM_CHUNK_WORDS", "4"))
+        self.stream_interval = float(os.getenv("FAKE_STREAM_INTERVAL", "0.05"))
+        self.image_size = int(os.getenv("FAKE_IMAGE_SIZE", "1024"))
+        self.index_videos = int(os.getenv("FAKE_INDEX_VIDEOS", "0"))
+        self.random = random.Random(os.getenv("FAKE_SEED", "0"))
+        self.lock = threading.Lock()
+
+    def call(self, name):
+        """Wait out one remote round trip, raising FakeBackendError at the configured rate."""
+        with self.lock:
+            delay = self.latency * self.random.uniform(0.5, 1.5)
+        time.sleep(delay)
+        if self.fails():
+            raise FakeBackendError(f"{name}: 503 Service Unavailable (injected failure)")
+
+    def fails(self):
+        with self.lock:
+            return self.random.random() < self.failure_rate
+
+    def sentence(self, words):
+        with self.lock:
+            return " ".join(self.random.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+    def timestamp(self):
+        with self.lock:
+            return f"{self.random.randint(0, 4)}:{self.random.randint(0, 59):02d}"
+
+
+class FakeTask:
+    def __init__(self, settings, tasks):
+        self.settings = settings
+        self.tasks = tasks
+        self.id = uuid.uuid4().hex
+        self.video_id = None
+        self.status = "pending"
+        self.created = time.time()
+
+    @property
+    def done(self):
+        return self.status in ("ready", "failed")
+
+    def retrieve(self):
+        return self.tasks.retrieve(self.id)
+
+    def wait_for_done(self, *, sleep_interval=5.0, callback=None):
+        while not self.done:
+            remaining = self.created + self.settings.indexing_seconds - time.time()
+            time.sleep(max(0.0, min(sleep_interval, remaining)))
+            if time.time() >= self.created + self.settings.indexing_seconds:
+                failed = self.settings.fails()
+                self.status = "failed" if failed else "ready"
+                self.video_id = None if failed else self.id[:24]
+            else:
+                self.status = "indexing"
+            if callback is not None:
+                callback(self)
+        return self
+
+
+class FakeTasks:
+    def __init__(self, settings):
+        self.settings = settings
+        self.tasks = {}
+
+    def create(self, index_id, file=None, url=None, **kwargs):
+        self.settings.call("task.create")
+        task = FakeTask(self.settings, self)
+        self.tasks[task.id] = task
+        return task
+
+    def retrieve(self, id, **kwargs):
+        self.settings.call("task.retrieve")
+        try:
+            return self.tasks[id]
+        except KeyError:
+            raise FakeBackendError(f"task.retrieve: 404 task {id} not found")
+
+
+class FakeIndexVideos:
+    def __init__(self, settings):
+        self.settings = settings
+        self.videos = [
+            SimpleNamespace(id=f"fake{i:020d}", source_url=None,
+                            metadata=SimpleNamespace(filename=f"fake_{i}.mp4"))
+            for i in range(settings.index_videos)
+        ]
+
+    def list(self, index_id, page=1, page_limit=10, **kwargs):
+        self.settings.call("index.video.list")
+        # Newest first, as the server asks for
+        newest = self.videos[::-1]
+        return newest[(page - 1) * page_limit:page * page_limit]
+
+
+class FakeTwelveLabs:
+    """The parts of ``twelvelabs.TwelveLabs`` used by server.py."""
+
+    def __init__(self, settings=None):
+        self.settings = settings or FakeSettings()
+        self.task = FakeTasks(self.settings)
+        self.index = SimpleNamespace(video=FakeIndexVideos(self.settings))
+
+    def _advice(self):
+        s = self.settings
+        return {key: [f"{s.sentence(6)[:-1]} at {s.timestamp()}" for _ in range(s.advice_items)] for key in ("good", "bad", "improve")}
+
+    def _reply(self):
+        s = self.settings
+        return f"Yo bro, {s.sentence(s.response_words // 2)}\n- {s.sentence(5)}\n{s.sentence(s.response_words // 2)}"
+
+    def analyze(self, video_id, prompt, **kwargs):
+        self.settings.call("analyze")
+        if "JSON format" in prompt:
+            return SimpleNamespace(data=json.dumps(self._advice()))
+        return SimpleNamespace(data=self._reply())
+
+    def analyze_stream(self, video_id, prompt, **kwargs):
+        # Like the SDK, yields the text of each text_generation event
+        self.settings.call("analyze_stream")
+        words = self._reply().split(" ")
+        size = max(1, self.settings.stream_chunk_words)
+        for i in range(0, len(words), size):
+            if i:
+                time.sleep(self.settings.stream_interval)
+            yield " ".join(words[i:i + size]) + " "
+
+    def summarize(self, video_id, type, **kwargs):
+        self.settings.call("summarize")
+        s = self.settings
+        if type == "summary":
+            return SimpleNamespace(summary=s.sentence(s.summary_words))
+        length = 30.0
+        return SimpleNamespace(chapters=[
+            SimpleNamespace(chapter_number=i, chapter_title=s.sentence(3)[:-1], chapter_summary=s.sentence(30),
+                            start=i * length, end=(i + 1) * length)
+            for i in range(s.chapters)
+        ])
+
+
+class FakeModels:
+    def __init__(self, settings):
+        self.settings = settings
+        self.image_data = None
+
+    def _image(self):
+        # Rendered once: the fake runs inside the server, so its own CPU cost must not show up in benchmarks
+        if self.image_data is None:
+            buffer = BytesIO()
+            Image.effect_noise((self.settings.image_size,) * 2, 48).convert("RGB").save(buffer, "PNG")
+            self.image_data = base64.b64encode(buffer.getvalue())
+        return self.image_data
+
+    def generate_content(self, model, contents, config=None, **kwargs):
+        self.settings.call("generate_content")
+        parts = [SimpleNamespace(text="Here is your thumbnail.", inline_data=None),
+                 SimpleNamespace(text=None, inline_data=SimpleNamespace(mime_type="image/png", data=self._image()))]
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=parts))])
+
+
+class FakeGenaiClient:
+    """The parts of ``google.genai.Client`` used by server.py."""
+
+    def __init__(self, settings=None):
+        self.models = FakeModels(settings or FakeSettings())
@@ -0,0 +1,70 @@
+import logging
+import threading
+import time
+
+import telemetry
+
+log = logging.getLogger(__name__)
+
+
+class IndexReconciler:
+    """Runs ``sync_fn`` on a background thread every ``interval`` seconds, or sooner when triggered.
+
+    Only one sync runs at a time; triggers that arrive during a sync are
+    folded into a single follow-up run. ``should_run`` is checked before
+    each sync, e.g. to keep a single reconciler across server processes.
+    """
+
+    def __init__(self, sync_fn, interval, should_run=None):
+        self.sync_fn = sync_fn
+        self.interval = interval
+        # Called with whether the sync was asked for by trigger(); False skips it
+        self.should_run = should_run
+        self.requested = False
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.running = False
+        self.last_finished_at = None
+        self.last_error = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name="index-sync", daemon=True)
+            self.thread.start()
+            # Sync once at startup rather than waiting a full interval
+            self.wakeup.set()
+
+    def trigger(self):
+        self.requested = True
+        self.wakeup.set()
+
+    def status(self):
+        return {
+            "running": self.running,
+            "last_finished_at": self.last_finished_at,
+            "last_error": self.last_error,
+            "interval": self.interval,
+        }
+
+    def _loop(self):
+        while True:
+            self.wakeup.wait(timeout=self.interval)
+            self.wakeup.clear()
+            requested, self.requested = self.requested, False
+            try:
+                if self.should_run and not self.should_run(requested):
+                    continue
+            except Exception as e:
+                log.exception("Index sync check failed: %s", e)
+                continue
+            self.running = True
+            try:
+                with telemetry.trace(), telemetry.span("index.sync"):
+                    self.sync_fn()
+                self.last_error = None
+            except Exception as e:
+                log.exception("Index sync failed: %s", e)
+                self.last_error = str(e)
+            finally:
+                self.running = False
+                self.last_finished_at = time.time()
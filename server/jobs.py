@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+import uuid
+
+# Ingest job lifecycle: uploaded -> [preprocessing] -> indexing -> enriching -> done | failed
+UPLOADED = "uploaded"
+PREPROCESSING = "preprocessing"
+INDEXING = "indexing"
+ENRICHING = "enriching"
+DONE = "done"
+FAILED = "failed"
+TERMINAL_STATES = (DONE, FAILED)
+
+
+class JobStore:
+    """Ingest job table, stored next to the video catalog so every server worker sees the same jobs."""
+
+    def __init__(self, db):
+        self.db = db
+        # Notified on every update so progress streams don't have to poll
+        self.changed = threading.Condition()
+        # Called with no arguments after every update, e.g. to wake waiters on an event loop
+        self.listeners = []
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def create(self, conn=None, **fields):
+        """Insert a new job, within the caller's write transaction if ``conn`` is given."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        job = {
+            "job_id": job_id,
+            "status": UPLOADED,
+            "progress": None,
+            "stages": [],
+            "partial": {},
+            "task_id": None,
+            "video_id": None,
+            "error": None,
+            "result": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        job.update(fields)
+        (conn or self.db).execute(
+            "INSERT INTO jobs (job_id, status, data, updated_at) VALUES (?, ?, ?, ?)",
+            (job_id, job["status"], json.dumps(job), now),
+        )
+        return job
+
+    def get(self, job_id):
+        row = self.db.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def update(self, job_id, **fields):
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            job = json.loads(row["data"])
+            job.update(fields)
+            job["updated_at"] = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, data = ?, updated_at = ? WHERE job_id = ?",
+                (job["status"], json.dumps(job), job["updated_at"], job_id),
+            )
+        with self.changed:
+            self.changed.notify_all()
+        for listener in self.listeners:
+            listener()
+        return job
+
+    def wait_for_update(self, job_id, updated_at, timeout):
+        """Block until the job changes after ``updated_at``. Returns the job, or None on timeout."""
+        deadline = time.time() + timeout
+        with self.changed:
+            while True:
+                job = self.get(job_id)
+                if job is None or job["updated_at"] > updated_at:
+                    return job
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                # Re-check at least every second to catch updates made by another server process
+                self.changed.wait(min(remaining, 1.0))
+
+    def counts(self):
+        """``{status: number of jobs}``."""
+        return {row["status"]: row[1] for row in self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")}
+
+    def claim(self, job_id, ttl):
+        """Take the job's lease, so that only one server process runs it. Returns False if another one has it."""
+        return self.db.acquire_lease(f"job:{job_id}", ttl)
+
+    def release(self, job_id):
+        self.db.release_lease(f"job:{job_id}")
+
+    def active_video_ids(self):
+        """video_ids of unfinished jobs that are already indexed (enriching, or resumed mid-enrichment)."""
+        placeholders = ", ".join("?" for _ in TERMINAL_STATES)
+        rows = self.db.execute(
+            f"SELECT json_extract(data, '$.video_id') AS video_id FROM jobs"
+            f" WHERE status NOT IN ({placeholders}) AND video_id IS NOT NULL",
+            TERMINAL_STATES,
+        ).fetchall()
+        return {row["video_id"] for row in rows}
+
+    def unfinished(self):
+        placeholders = ", ".join("?" for _ in TERMINAL_STATES)
+        rows = self.db.execute(f"SELECT data FROM jobs WHERE status NOT IN ({placeholders})", TERMINAL_STATES).fetchall()
+        return [json.loads(row["data"]) for row in rows]
@@ -0,0 +1,119 @@
+import math
+import os
+
+import cv2
+import numpy as np
+
+SAMPLE_COUNT = 16
+SCORE_WIDTH = 160
+POSTER_SIZE = 400
+TILE_WIDTH, TILE_HEIGHT = 192, 108
+SPRITE_COLUMNS = 8
+CHAPTER_BONUS = 1.25
+
+
+class LocalThumbnailError(Exception):
+    pass
+
+
+def _score(gray, prev_gray):
+    """Higher for sharp, well-lit frames with action in them."""
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    motion = cv2.absdiff(gray, prev_gray).mean() if prev_gray is not None else 0.0
+    score = math.log1p(sharpness) * (1 + motion / 32)
+    brightness = gray.mean()
+    if brightness < 25 or brightness > 235:
+        # Loading screens, fades and flashes make bad posters
+        score *= 0.2
+    return score
+
+
+def _read_at(capture, seconds):
+    capture.set(cv2.CAP_PROP_POS_MSEC, seconds * 1000)
+    ok, frame = capture.read()
+    return frame if ok else None
+
+
+def _square(frame, size):
+    height, width = frame.shape[:2]
+    side = min(height, width)
+    top, left = (height - side) // 2, (width - side) // 2
+    return cv2.resize(frame[top:top + side, left:left + side], (size, size), interpolation=cv2.INTER_AREA)
+
+
+def render_previews(source, video_id, chapters, out_dir):
+    """Pick representative frames from a local file (or URL OpenCV can open) and write preview images.
+
+    Writes ``poster_<video_id>.jpg``, a square poster from the best-scoring
+    frame, and ``sprite_<video_id>.jpg``, a sheet with one tile per chapter
+    start (or evenly spaced frames when there are no chapters). Returns paths
+    and the sprite layout.
+    """
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise LocalThumbnailError(f"Could not open video {source}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0
+        frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+        duration = frame_count / fps if fps > 0 else 0
+        if duration <= 0:
+            raise LocalThumbnailError(f"Could not read duration of {source}")
+
+        # Evenly spaced samples, skipping the very start and end, plus each chapter start
+        candidates = [(duration * (0.05 + 0.9 * i / (SAMPLE_COUNT - 1)), None) for i in range(SAMPLE_COUNT)]
+        for chapter in chapters or []:
+            start = chapter.get("start")
+            if start is not None and 0 <= start < duration:
+                # A little past the cut, chapter boundaries often land on transitions
+                candidates.append((min(start + 0.5, duration - 0.1), chapter))
+        candidates.sort(key=lambda c: c[0])
+
+        best = None  # (score, frame)
+        tiles = []
+        prev_gray = None
+        for seconds, chapter in candidates:
+            frame = _read_at(capture, seconds)
+            if frame is None:
+                continue
+            height, width = frame.shape[:2]
+            small = cv2.resize(frame, (SCORE_WIDTH, max(1, int(height * SCORE_WIDTH / width))), interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            score = _score(gray, prev_gray) * (CHAPTER_BONUS if chapter else 1)
+            prev_gray = gray
+            if best is None or score > best[0]:
+                best = (score, frame)
+            if chapter or not chapters:
+                tiles.append((seconds, chapter, cv2.resize(frame, (TILE_WIDTH, TILE_HEIGHT), interpolation=cv2.INTER_AREA)))
+        if best is None:
+            raise LocalThumbnailError(f"Could not decode any frames from {source}")
+    finally:
+        capture.release()
+
+    os.makedirs(out_dir, exist_ok=True)
+    poster_path = os.path.join(out_dir, f"poster_{video_id}.jpg").replace("\\", "/")
+    cv2.imwrite(poster_path, _square(best[1], POSTER_SIZE), [cv2.IMWRITE_JPEG_QUALITY, 85])
+
+    previews = {"poster_path": poster_path, "sprite_path": None, "tile_width": TILE_WIDTH, "tile_height": TILE_HEIGHT, "tiles": []}
+    if not tiles:
+        return previews
+    if not chapters:
+        # Without chapters, keep at most one row of evenly spaced tiles
+        step = max(1, math.ceil(len(tiles) / SPRITE_COLUMNS))
+        tiles = tiles[::step]
+    columns = min(SPRITE_COLUMNS, len(tiles))
+    rows = math.ceil(len(tiles) / columns)
+    sheet = np.zeros((TILE_HEIGHT * rows, TILE_WIDTH * columns, 3), dtype=np.uint8)
+    layout = []
+    for i, (seconds, chapter, tile) in enumerate(tiles):
+        x, y = (i % columns) * TILE_WIDTH, (i // columns) * TILE_HEIGHT
+        sheet[y:y + TILE_HEIGHT, x:x + TILE_WIDTH] = tile
+        layout.append({
+            "start": chapter["start"] if chapter else round(seconds, 2),
+            "chapter_number": chapter.get("chapter_number") if chapter else None,
+            "x": x,
+            "y": y,
+        })
+    sprite_path = os.path.join(out_dir, f"sprite_{video_id}.jpg").replace("\\", "/")
+    cv2.imwrite(sprite_path, sheet, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    previews.update(sprite_path=sprite_path, tiles=layout)
+    return previews
@@ -0,0 +1,145 @@
+import os
+import re
+import subprocess
+import threading
+
+import cv2
+import imageio_ffmpeg
+
+# Twelve Labs indexing requirements
+MIN_DURATION = 4
+MAX_DURATION = 60 * 60
+MIN_SHORT_SIDE = 360
+MAX_LONG_SIDE = 4096
+MAX_SIZE = 2 * 1024 ** 3
+
+# Dead-time detection: sample rate, motion threshold (mean abs diff, 0-255) and minimum run to cut
+TRIM_SAMPLE_FPS = 2
+TRIM_MOTION_THRESHOLD = 2.0
+TRIM_MIN_DEAD_SECONDS = 8
+TRIM_PADDING = 1.0
+
+
+class PreprocessError(Exception):
+    pass
+
+
+def probe(path):
+    """Duration, resolution and audio presence from the ffmpeg bundled with imageio-ffmpeg."""
+    result = subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-i", path],
+                            capture_output=True, text=True, timeout=30)
+    info = result.stderr
+    duration = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", info)
+    video = re.search(r"Stream #.*Video: .*?(\d{2,5})x(\d{2,5})", info)
+    if not duration or not video:
+        raise PreprocessError("Could not read video stream. Ensure the file is a valid video.")
+    hours, minutes, seconds = duration.groups()
+    return {
+        "duration": int(hours) * 3600 + int(minutes) * 60 + float(seconds),
+        "width": int(video.group(1)),
+        "height": int(video.group(2)),
+        "has_audio": re.search(r"Stream #.*Audio: ", info) is not None,
+        "size": os.path.getsize(path),
+    }
+
+
+def validate(info):
+    """Raise PreprocessError if the probed video would be rejected by indexing."""
+    if info["size"] > MAX_SIZE:
+        raise PreprocessError(f"Video is {info['size'] / 1024 ** 3:.1f}GB, the limit is 2GB.")
+    if not MIN_DURATION <= info["duration"] <= MAX_DURATION:
+        raise PreprocessError(f"Video is {info['duration']:.0f}s long, it must be between 4s and 60min.")
+    short_side, long_side = sorted((info["width"], info["height"]))
+    if short_side < MIN_SHORT_SIDE or long_side > MAX_LONG_SIDE:
+        raise PreprocessError(f"Video is {info['width']}x{info['height']}, it must be between 360p and 4K.")
+    if not info["has_audio"]:
+        raise PreprocessError("Video has no audio track.")
+
+
+def find_live_segments(path, duration):
+    """``[(start, end)]`` spans worth keeping, dropping long stretches with almost no motion (lobby, menus, idle spectating)."""
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        return [(0, duration)]
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    step = max(1, round(fps / TRIM_SAMPLE_FPS))
+    dead_since = None
+    dead_spans = []
+    prev = None
+    index = 0
+    try:
+        # grab() skips decoding for the frames between samples
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                gray = cv2.cvtColor(cv2.resize(frame, (160, 90), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+                seconds = index / fps
+                if prev is not None:
+                    if cv2.absdiff(gray, prev).mean() < TRIM_MOTION_THRESHOLD:
+                        dead_since = seconds if dead_since is None else dead_since
+                    else:
+                        if dead_since is not None and seconds - dead_since >= TRIM_MIN_DEAD_SECONDS:
+                            dead_spans.append((dead_since, seconds))
+                        dead_since = None
+                prev = gray
+            index += 1
+    finally:
+        capture.release()
+    if dead_since is not None and duration - dead_since >= TRIM_MIN_DEAD_SECONDS:
+        dead_spans.append((dead_since, duration))
+
+    segments = []
+    cursor = 0.0
+    for start, end in dead_spans:
+        # Keep a little context either side of each cut
+        if start + TRIM_PADDING > cursor:
+            segments.append((cursor, start + TRIM_PADDING))
+        cursor = max(cursor, end - TRIM_PADDING)
+    if cursor < duration:
+        segments.append((cursor, duration))
+    return segments
+
+
+def preprocess(path, info, target_height=720, trim=False):
+    """Downscale to ``target_height`` and optionally cut dead time, writing ``<name>-<variant>.mp4`` next to ``path``.
+
+    Returns the path to upload, which is ``path`` itself when there is nothing to do.
+    """
+    filters = []
+    suffix = []
+    segments = find_live_segments(path, info["duration"]) if trim else [(0, info["duration"])]
+    if len(segments) > 1 or segments[0] != (0, info["duration"]):
+        kept = sum(end - start for start, end in segments)
+        if kept < MIN_DURATION:
+            segments = [(0, info["duration"])]
+        else:
+            select = "+".join(f"between(t,{start:.2f},{end:.2f})" for start, end in segments)
+            filters.append(f"select='{select}',setpts=N/FRAME_RATE/TB")
+            suffix.append("trim")
+    if target_height and min(info["width"], info["height"]) > target_height:
+        # Scale the short side so portrait clips are treated the same way
+        scale = f"scale=-2:{target_height}" if info["height"] <= info["width"] else f"scale={target_height}:-2"
+        filters.append(scale)
+        suffix.insert(0, f"{target_height}p")
+    if not filters:
+        return path
+
+    output = f"{os.path.splitext(path)[0]}-{'-'.join(suffix)}.mp4"
+    if os.path.exists(output):
+        return output
+    command = [imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y", "-i", path,
+               "-vf", ",".join(filters), "-c:v", "libx264", "-preset", "veryfast", "-crf", "26"]
+    if "trim" in suffix:
+        command += ["-af", f"aselect='{select}',asetpts=N/SR/TB"]
+    # Per-process temp name: two jobs for the same upload may transcode it at once
+    tmp = f"{output}.{os.getpid()}-{threading.get_ident()}.tmp.mp4"
+    command += ["-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", tmp]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise PreprocessError(f"Transcode failed: {result.stderr.strip()[-500:]}")
+    os.replace(tmp, output)
+    return output
@@ -0,0 +1,189 @@
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+
+TOKEN = re.compile(r"[a-z0-9]+")
+# "1:15" or "1:02:30", as the advice prompt asks for, and "57s" / "1m 15s", which the model often writes instead
+TIMESTAMP = re.compile(r"\b(?:(?:(\d{1,2}):)?(\d{1,2}):(\d{2})|(?:(\d{1,3})m\s*)?(\d{1,4})s)\b")
+STOPWORDS = frozenset("a an and are as at be by during for from in into is it of on or the their this to with".split())
+SUFFIXES = ("ing", "ed", "es", "s")
+
+# BM25 parameters, and how much a match counts for each kind of moment
+K1 = 1.2
+B = 0.75
+KIND_WEIGHTS = {"summary": 1.0, "chapter": 1.5, "advice": 2.0}
+
+
+def _stem(token):
+    """Crude suffix stripping so "builds", "building" and "build" match each other."""
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    return [_stem(token) for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def parse_timestamps(text):
+    """Seconds for every timestamp in ``text``."""
+    seconds = []
+    for h, m, s, short_m, short_s in TIMESTAMP.findall(text):
+        if s:
+            seconds.append(int(h or 0) * 3600 + int(m) * 60 + int(s))
+        else:
+            seconds.append(int(short_m or 0) * 60 + int(short_s))
+    return seconds
+
+
+def _moments(video):
+    """Searchable pieces of a catalog record: the summary, each chapter and each advice line."""
+    video_id = video["video_id"]
+    if isinstance(video.get("summary"), str):
+        yield {"video_id": video_id, "kind": "summary", "start": None, "end": None, "text": video["summary"]}
+    for chapter in video.get("chapters") or []:
+        text = f"{chapter.get('chapter_title', '')}. {chapter.get('chapter_summary', '')}"
+        yield {"video_id": video_id, "kind": "chapter", "start": chapter.get("start"), "end": chapter.get("end"),
+               "chapter_number": chapter.get("chapter_number"), "chapter_title": chapter.get("chapter_title"), "text": text}
+    advice = video.get("advice")
+    for category, items in (advice.items() if isinstance(advice, dict) else []):
+        for item in items or []:
+            if not isinstance(item, str):
+                continue
+            timestamps = parse_timestamps(item)
+            yield {"video_id": video_id, "kind": "advice", "category": category,
+                   "start": timestamps[0] if timestamps else None, "end": None, "text": item}
+
+
+class SearchIndex:
+    """In-memory BM25 index over catalog text, returning ranked ``(video_id, timestamp)`` moments.
+
+    Each chapter and advice line is its own document, so a hit points at a
+    place in the video rather than just the video. Chapters are also kept as
+    sorted intervals per video, to find the chapter an advice timestamp falls in.
+    The index follows the catalog incrementally through ``refresh()``.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.docs = {}  # doc_id -> (moment, length)
+        self.norms = None  # doc_id -> BM25 length normalisation, rebuilt lazily after changes
+        self.by_video = {}  # video_id -> [doc_id]
+        self.chapters = {}  # video_id -> (starts, chapter moments), sorted by start
+        self.total_length = 0
+        self.next_id = 0
+        self.version = None
+        self.synced_until = 0.0
+
+    def _remove(self, video_id):
+        for doc_id in self.by_video.pop(video_id, []):
+            moment, length = self.docs.pop(doc_id)
+            self.total_length -= length
+            for term in set(tokenize(moment["text"])):
+                postings = self.postings[term]
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.chapters.pop(video_id, None)
+
+    def _add(self, video):
+        video_id = video["video_id"]
+        self._remove(video_id)
+        doc_ids = []
+        chapters = []
+        for moment in _moments(video):
+            terms = tokenize(moment["text"])
+            if not terms:
+                continue
+            doc_id = self.next_id
+            self.next_id += 1
+            self.docs[doc_id] = (moment, len(terms))
+            self.total_length += len(terms)
+            for term in terms:
+                postings = self.postings[term]
+                postings[doc_id] = postings.get(doc_id, 0) + 1
+            doc_ids.append(doc_id)
+            if moment["kind"] == "chapter" and moment["start"] is not None:
+                chapters.append(moment)
+        self.by_video[video_id] = doc_ids
+        self.norms = None
+        if chapters:
+            chapters.sort(key=lambda c: c["start"])
+            self.chapters[video_id] = ([c["start"] for c in chapters], chapters)
+
+    def refresh(self, catalog):
+        """Index records written to ``catalog`` since the last refresh. Cheap when nothing changed."""
+        version = catalog.version()
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            for video, updated_at in catalog.changed_since(self.synced_until):
+                self._add(video)
+                self.synced_until = max(self.synced_until, updated_at)
+            self.version = version
+
+    def chapter_at(self, video_id, seconds):
+        """The chapter of ``video_id`` playing at ``seconds``, or None."""
+        starts, chapters = self.chapters.get(video_id, ((), ()))
+        i = bisect_right(starts, seconds) - 1
+        if i < 0:
+            return None
+        chapter = chapters[i]
+        if chapter["end"] is not None and seconds > chapter["end"]:
+            return None
+        return chapter
+
+    def search(self, query, limit=20, video_id=None, start=None, end=None):
+        """Top ``limit`` moments for ``query``, optionally limited to one video and/or a time window."""
+        with self.lock:
+            if not self.docs:
+                return []
+            if self.norms is None:
+                average_length = self.total_length / len(self.docs)
+                self.norms = {doc_id: K1 * (1 - B + B * length / average_length) for doc_id, (_, length) in self.docs.items()}
+            norms = self.norms
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (len(self.docs) - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    scores[doc_id] += idf * tf * (K1 + 1) / (tf + norms[doc_id])
+
+            def matches(doc_id):
+                moment = self.docs[doc_id][0]
+                if video_id and moment["video_id"] != video_id:
+                    return False
+                if start is None and end is None:
+                    return True
+                if moment["start"] is None:
+                    return False
+                if moment["end"] is None:
+                    # A point in time, e.g. an advice timestamp
+                    return (start is None or moment["start"] >= start) and (end is None or moment["start"] <= end)
+                return (start is None or moment["end"] > start) and (end is None or moment["start"] < end)
+
+            ranked = heapq.nlargest(
+                limit,
+                ((score * KIND_WEIGHTS[self.docs[doc_id][0]["kind"]], doc_id) for doc_id, score in scores.items() if matches(doc_id)),
+            )
+            results = []
+            for score, doc_id in ranked:
+                moment = dict(self.docs[doc_id][0])
+                moment["score"] = round(score, 4)
+                if moment["kind"] == "advice" and moment["start"] is not None:
+                    chapter = self.chapter_at(moment["video_id"], moment["start"])
+                    moment["chapter_title"] = chapter["chapter_title"] if chapter else None
+                results.append(moment)
+            return results
+
+    def __len__(self):
+        return len(self.docs)
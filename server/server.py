@@ -1,10 +1,12 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, g, request, jsonify, send_file
+from werkzeug.security import safe_join
 from flask_cors import CORS
 import os
 from twelvelabs import TwelveLabs
 from twelvelabs.models.task import Task
 from dotenv import load_dotenv
 import json
+import threading
 import time
 import urllib.parse
 from google import genai
@@ -12,380 +14,925 @@ from google.genai.types import GenerateContentConfig, Modality
 from PIL import Image
 from io import BytesIO
 import base64
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from enrichment import Stage, run_stages
+from store import Database, VideoStore
+from chat_store import ChatSessionStore
+import assets
+import telemetry
+from content_store import ContentIndex, HashingRequest, commit_upload, discard_upload, url_content_hash
+from index_sync import IndexReconciler
+from search_index import SearchIndex
+from local_thumbnails import LocalThumbnailError, render_previews
+from thumbnails import ThumbnailError, ThumbnailService
+from streaming import ResponseCleaner, clean_response, sse, sse_response
+from preprocess import PreprocessError, preprocess, probe, validate
+from jobs import JobStore, PREPROCESSING, INDEXING, ENRICHING, DONE, FAILED, TERMINAL_STATES
 
 app = Flask(__name__)
-CORS(app, origins=["http://localhost:5173"])
+# Multipart uploads are hashed as they are spooled to disk, see content_store.py
+app.request_class = HashingRequest
+CORS(app, origins=["http://localhost:5173"], expose_headers=["ETag", "X-Next-Cursor", "X-Request-ID"])
 load_dotenv()
+telemetry.setup_logging()
+log = logging.getLogger("server")
+
+@app.before_request
+def start_request_telemetry():
+    # Correlation id for every span and log line of the request, echoed back in X-Request-ID
+    g.trace_token = telemetry.trace_id_var.set(request.headers.get("X-Request-ID", "")[:64] or telemetry.new_trace_id())
+    g.started_at = time.perf_counter()
+    telemetry.http_in_flight.inc()
+
+@app.after_request
+def record_request_telemetry(response):
+    route = request.endpoint or "unmatched"
+    telemetry.http_requests.inc(method=request.method, route=route, status=response.status_code)
+    telemetry.http_duration.observe(time.perf_counter() - g.started_at, method=request.method, route=route)
+    response.headers["X-Request-ID"] = telemetry.trace_id_var.get()
+    return response
+
+@app.teardown_request
+def discard_upload_spools(exc):
+    # Multipart file parts are spooled to uploads/ for any route; only queue_upload commits them
+    request.discard_spools()
+
+@app.teardown_request
+def end_request_telemetry(exc):
+    # Runs after the last chunk of a streamed response
+    if "trace_token" in g:
+        telemetry.http_in_flight.dec()
+        telemetry.trace_id_var.reset(g.pop("trace_token"))
+
+# Offline stand-ins with configurable latency and failures, for benchmarks (see fakes.py and bench.py)
+FAKE_BACKENDS = os.getenv("FAKE_BACKENDS", "false").lower() == "true"
+if FAKE_BACKENDS:
+    from fakes import FakeGenaiClient, FakeTwelveLabs
 
 client = None
 try:
-    client = TwelveLabs(api_key=os.getenv("TL_API_KEY"))
-    print("Twelve Labs client initialized")
+    client = FakeTwelveLabs() if FAKE_BACKENDS else TwelveLabs(api_key=os.getenv("TL_API_KEY"))
+    log.info("Twelve Labs client initialized")
 except Exception as e:
-    print(f"Failed to initialize Twelve Labs client: {e}")
+    log.error("Failed to initialize Twelve Labs client: %s", e)
 
 try:
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not found in .env")
-    print(f"Loaded GEMINI_API_KEY: {api_key[:5]}...{api_key[-5:]}")
-    gemini_client = genai.Client(api_key=api_key)
-    print("Gemini client initialized")
+    if FAKE_BACKENDS:
+        gemini_client = FakeGenaiClient()
+    else:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in .env")
+        log.info("Loaded GEMINI_API_KEY: %s...%s", api_key[:5], api_key[-5:])
+        gemini_client = genai.Client(api_key=api_key)
+    log.info("Gemini client initialized")
 except Exception as e:
-    print(f"Failed to initialize Gemini client: {e}")
+    log.error("Failed to initialize Gemini client: %s", e)
 
 
 INDEX_NAME = "FortniteVODs"
 index_id = "687c96f2c5994cb471749ec0"
 VIDEO_METADATA_FILE = "videos.json"
-chat_histories = {}
-
-def load_videos():
+CATALOG_DB_FILE = "catalog.db"
+INDEXING_TIMEOUT = 600
+INDEXING_POLL_INTERVAL = 10
+ENRICHMENT_STAGE_TIMEOUT = 120
+INDEX_SYNC_INTERVAL = int(os.getenv("INDEX_SYNC_INTERVAL", "300"))
+# Ingest jobs and the index sync are leased to one server process, renewed while it is alive;
+# work whose process died is taken over once its lease runs out
+LEASE_TTL = int(os.getenv("LEASE_TTL", "60"))
+INDEX_SYNC_PAGE_LIMIT = 50
+# /api/videos page size when ?limit= is missing, and the largest page one request can ask for
+VIDEOS_PAGE_SIZE = int(os.getenv("VIDEOS_PAGE_SIZE", "50"))
+VIDEOS_PAGE_MAX = int(os.getenv("VIDEOS_PAGE_MAX", "200"))
+# Sync stages in flight at once, so a large first sync leaves most of the enrichment pool to ingest jobs
+INDEX_SYNC_CONCURRENCY = int(os.getenv("INDEX_SYNC_CONCURRENCY", "4"))
+# Uploaded files are checked locally, then optionally downscaled (e.g. 720) and trimmed before indexing.
+# Off by default: the transcode runs before the indexing deadline starts but still delays the job
+PREPROCESS_TARGET_HEIGHT = int(os.getenv("PREPROCESS_TARGET_HEIGHT", "0"))
+PREPROCESS_TRIM = os.getenv("PREPROCESS_TRIM", "false").lower() == "true"
+# Gemini art replaces the local poster in the background once it is ready
+GEMINI_THUMBNAIL_UPGRADE = os.getenv("GEMINI_THUMBNAIL_UPGRADE", "true").lower() == "true"
+
+# Video metadata and ingest jobs share one SQLite catalog; videos.json is only read once to seed it
+db = Database(CATALOG_DB_FILE)
+catalog = VideoStore(db)
+imported = catalog.import_json(VIDEO_METADATA_FILE)
+if imported:
+    log.info("Imported %d videos from %s", imported, VIDEO_METADATA_FILE)
+
+# Ingest runs off the request thread so /api/upload returns immediately
+jobs = JobStore(db)
+content_index = ContentIndex(db)
+# Summaries, chapters and advice are searchable without a remote call; the index follows the catalog
+search_index = SearchIndex()
+search_index.refresh(catalog)
+# Chat prompts carry a fixed-size history: recent turns verbatim, older ones rolled into a summary
+chat_sessions = ChatSessionStore(
+    db,
+    max_turns=int(os.getenv("CHAT_MAX_TURNS", "6")),
+    summary_chars=int(os.getenv("CHAT_SUMMARY_CHARS", "1500")),
+    cache_size=int(os.getenv("CHAT_CACHE_SIZE", "256")),
+    ttl=int(os.getenv("CHAT_SESSION_TTL", str(7 * 24 * 3600))),
+)
+ingest_executor = ThreadPoolExecutor(max_workers=int(os.getenv("INGEST_WORKERS", "4")), thread_name_prefix="ingest")
+# Separate pool for the remote calls fanned out by ingest jobs, so they never wait on an ingest slot
+enrichment_executor = ThreadPoolExecutor(max_workers=int(os.getenv("ENRICHMENT_WORKERS", "16")), thread_name_prefix="enrich")
+
+# Sizes read at scrape time, see /metrics
+telemetry.Gauge("catalog_videos", "Videos in the catalog", fn=lambda: len(catalog))
+telemetry.Gauge("search_index_documents", "Moments in the search index", fn=lambda: len(search_index))
+telemetry.Gauge("chat_sessions_cached", "Chat sessions held in memory", fn=lambda: len(chat_sessions))
+telemetry.Gauge("ingest_jobs", "Ingest jobs by status", ["status"], fn=lambda: {(status,): n for status, n in jobs.counts().items()})
+telemetry.Gauge("executor_queued_tasks", "Tasks waiting for a worker thread", ["pool"], fn=lambda: {
+    ("ingest",): ingest_executor._work_queue.qsize(),
+    ("enrichment",): enrichment_executor._work_queue.qsize(),
+    ("thumbnail",): thumbnail_executor._work_queue.qsize(),
+})
+
+ADVICE_PROMPT = (
+    "Analyze this Fortnite gameplay video and provide detailed feedback in JSON format with keys 'good', 'bad', and 'improve', each containing a list of up to 5 strings. Focus on specific gameplay elements like aim, building, positioning, decision-making, and resource management. For 'bad' and 'improve', include specific timestamps (e.g., '0:45') where the issue or improvement opportunity occurred. Ensure feedback is precise and tied to specific moments in the video. Example:\n"
+    "{\n"
+    "  \"good\": [\"Accurate aim on headshots at 0:30\", \"Effective building during combat at 1:15\", \"Good positioning on high ground at 2:00\"],\n"
+    "  \"bad\": [\"Missed shots during exchange at 0:45\", \"Poor positioning in storm at 1:30\"],\n"
+    "  \"improve\": [\"Practice quicker building at 1:15 to minimize exposure\", \"Improve situational awareness at 0:45 to avoid ambushes\"]\n"
+    "}\n"
+    "Ensure the response is a valid JSON object."
+)
+FAILED_ADVICE = {
+    "good": ["Analysis failed, unable to evaluate gameplay"],
+    "bad": ["Analysis failed, unable to evaluate gameplay"],
+    "improve": ["Check video requirements (360p-4K, 4s-60min, <2GB, audio) and try again"]
+}
+
+def generate_advice(video_id):
+    advice = {"good": [], "bad": [], "improve": []}
+    with telemetry.remote_call("twelvelabs", "analyze"):
+        res = client.analyze(video_id=video_id, prompt=ADVICE_PROMPT)
+    if hasattr(res, "data"):
+        if isinstance(res.data, dict):
+            advice = res.data
+        elif isinstance(res.data, str):
+            try:
+                advice = json.loads(res.data)
+            except json.JSONDecodeError:
+                log.warning("Non-JSON advice response: %s", res.data)
+                lines = res.data.split('\n')
+                for line in lines:
+                    line = line.strip()
+                    if line.startswith("Good:") or line.startswith("- Good:"):
+                        advice["good"].append(line.replace("Good:", "").replace("- Good:", "").strip())
+                    elif line.startswith("Bad:") or line.startswith("- Bad:"):
+                        advice["bad"].append(line.replace("Bad:", "").replace("- Bad:", "").strip())
+                    elif line.startswith("Improve:") or line.startswith("- Improve:"):
+                        advice["improve"].append(line.replace("Improve:", "").replace("- Improve:", "").strip())
+    log.debug("Generated advice: %s", advice)
+    return advice
+
+def generate_summary(video_id):
+    with telemetry.remote_call("twelvelabs", "summarize"):
+        summary = client.summarize(video_id=video_id, type="summary").summary
+    log.debug("Generated summary: %s", summary)
+    return summary
+
+def generate_chapters(video_id):
+    with telemetry.remote_call("twelvelabs", "summarize"):
+        response = client.summarize(video_id=video_id, type="chapter")
+    chapters = [
+        {
+            "chapter_number": c.chapter_number,
+            "chapter_title": c.chapter_title,
+            "chapter_summary": c.chapter_summary,
+            "start": c.start,
+            "end": c.end
+        } for c in response.chapters
+    ]
+    log.debug("Generated chapters: %d", len(chapters))
+    return chapters
+
+def render_gemini_thumbnail(video_id, summary):
+    """Generate thumbnail with Gemini 2.0 Flash, returning its URL or None if no image came back.
+
+    Call through ``thumbnails`` rather than directly, so requests are coalesced and rate limited.
+    """
+    # model = gemini_client.models.get("gemini-2.0-flash-preview-image-generation")
+    with telemetry.remote_call("gemini", "generate_content"):
+        response = gemini_client.models.generate_content(
+            model="gemini-2.0-flash-preview-image-generation",
+            contents=(
+                f"Generate an image for a Fortnite gameplay video thumbnail with the summary: '{summary}'. "
+                "Include vibrant colors (#178FDB to #6AE2FD gradient background), SypherPK's Icon Series skin or Chun-Li, "
+                "and elements like weapons, builds, or loot chests. Make it dynamic, action-packed, with a bold Fortnite aesthetic "
+                "using 'Luckiest Guy' font style for any text. Ensure the output is an image (400x400 pixels)."
+            ),
+            config=GenerateContentConfig(response_modalities=[Modality.TEXT, Modality.IMAGE])
+        )
+    for part in response.candidates[0].content.parts:
+        if hasattr(part, "text") and part.text:
+            log.debug("Gemini response text: %s", part.text)
+        elif hasattr(part, "inline_data") and part.inline_data:
+            thumbnail_path = f"uploads/thumbnail_{video_id}.png"
+            with telemetry.span("thumbnail.resize"):
+                image_data = base64.b64decode(part.inline_data.data)
+                image = Image.open(BytesIO(image_data))
+                image = image.resize((400, 400), Image.Resampling.LANCZOS)
+                image.save(thumbnail_path, "PNG")
+            assets.make_variants(thumbnail_path)
+            thumbnail_url = assets.versioned_url("http://localhost:5000", thumbnail_path)
+            log.info("Generated thumbnail: %s", thumbnail_url)
+            return thumbnail_url
+    return None
+
+# Every Gemini thumbnail request (ingest, index sync, /api/generate-image) goes through this service
+GEMINI_MAX_CONCURRENT = int(os.getenv("GEMINI_MAX_CONCURRENT", "2"))
+thumbnails = ThumbnailService(
+    render_gemini_thumbnail,
+    max_concurrent=GEMINI_MAX_CONCURRENT,
+    rate=float(os.getenv("GEMINI_RATE_PER_SEC", "1")),
+    burst=int(os.getenv("GEMINI_BURST", "4")),
+    retries=int(os.getenv("GEMINI_RETRIES", "2")),
+    negative_ttl=int(os.getenv("GEMINI_NEGATIVE_TTL", "300")),
+)
+# Background upgrades wait on the service's rate limit, so they queue here instead of holding enrichment workers
+thumbnail_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENT, thread_name_prefix="thumbnail")
+
+telemetry.CallbackCounter("thumbnail_service_events_total", "Gemini thumbnail calls, coalesced requests, negative cache hits and failures",
+                          ["event"], fn=lambda: {(event,): n for event, n in thumbnails.stats.items()})
+
+def generate_thumbnail(video_id, summary):
+    return thumbnails.get(video_id, summary)
+
+def local_video_source(video_path):
+    """Where OpenCV can read the video from: the uploaded file, or the URL it was submitted with."""
+    if video_path and os.path.exists(video_path):
+        return video_path
+    if video_path and video_path.startswith(("http://", "https://")):
+        return video_path
+    return None
+
+def render_local_previews(video_id, video_path, chapters):
+    """Poster and chapter sprite cut from the video's own frames, or None if the video can't be read here."""
+    source = local_video_source(video_path)
+    if not source:
+        return None
     try:
-        with open(VIDEO_METADATA_FILE, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
-
-def save_videos(videos):
-    with open(VIDEO_METADATA_FILE, "w") as f:
-        json.dump(videos, f, indent=2)
+        with telemetry.span("previews.render"):
+            previews = render_previews(source, video_id, chapters, "uploads")
+    except LocalThumbnailError as e:
+        log.warning("Failed to render local previews for video %s: %s", video_id, e)
+        return None
+    log.info("Rendered local previews for video %s", video_id)
+    assets.make_variants(previews["poster_path"])
+    return {
+        "poster_url": assets.versioned_url("http://localhost:5000", previews["poster_path"]),
+        "sprite_url": assets.versioned_url("http://localhost:5000", previews["sprite_path"]) if previews["sprite_path"] else None,
+        "tile_width": previews["tile_width"],
+        "tile_height": previews["tile_height"],
+        "tiles": previews["tiles"],
+    }
+
+def pick_thumbnail(video_id, summary, previews):
+    """Use the local poster when there is one; only fall back to waiting on Gemini without it."""
+    if previews:
+        return previews["poster_url"]
+    return generate_thumbnail(video_id, summary)
+
+def upgrade_thumbnail_async(video_id, summary):
+    """Swap a local poster for Gemini art in the background. The catalog record must already exist."""
+    if not GEMINI_THUMBNAIL_UPGRADE:
+        return
+
+    def upgrade():
+        try:
+            catalog.update(video_id, thumbnail_url=generate_thumbnail(video_id, summary))
+        except ThumbnailError as e:
+            log.warning("Gemini thumbnail upgrade failed for video %s: %s", video_id, e)
+
+    thumbnail_executor.submit(telemetry.bind_context(upgrade))
+
+def enrich_video(video_id, video_path=None, on_stage_done=None):
+    """Run the post-index calls for one video and return ``{stage: result}``.
+
+    Local previews wait on the chapters (to prefer chapter starts) and the
+    thumbnail waits on the summary and previews; everything else runs at once.
+    """
+    return run_stages([
+        Stage("advice", lambda: generate_advice(video_id), timeout=ENRICHMENT_STAGE_TIMEOUT, fallback=FAILED_ADVICE),
+        Stage("summary", lambda: generate_summary(video_id), timeout=ENRICHMENT_STAGE_TIMEOUT, fallback="Summary generation failed"),
+        Stage("chapters", lambda: generate_chapters(video_id), timeout=ENRICHMENT_STAGE_TIMEOUT, fallback=[]),
+        Stage("previews", lambda chapters: render_local_previews(video_id, video_path, chapters), deps=["chapters"],
+              timeout=ENRICHMENT_STAGE_TIMEOUT),
+        Stage("thumbnail_url", lambda summary, previews: pick_thumbnail(video_id, summary, previews), deps=["summary", "previews"],
+              timeout=ENRICHMENT_STAGE_TIMEOUT),
+    ], enrichment_executor, on_stage_done=on_stage_done)
+
+def run_ingest(job_id):
+    """Index and enrich one uploaded video in the background, recording progress on the job."""
+    job = jobs.get(job_id)
+    # Spans and log lines of the job stay in the trace of the upload request that queued it
+    try:
+        with telemetry.trace(job.get("trace_id")), telemetry.span("ingest", job_id=job_id):
+            ingest(job_id, job)
+    finally:
+        jobs.release(job_id)
 
-@app.route("/api/upload", methods=["POST"])
-def upload_video():
+def ingest(job_id, job):
+    """Body of run_ingest, run inside the job's trace."""
     try:
-        print("Received upload request")
-        if not index_id:
-            print("No valid index_id")
-            return jsonify({"error": "No valid index_id. Please verify the index ID in server.py and Twelve Labs dashboard."}), 500
-
-        if "file" in request.files:
-            video_file = request.files["file"]
-            filename = urllib.parse.quote(video_file.filename)
-            video_path = os.path.join("uploads", video_file.filename).replace("\\", "/")
-            os.makedirs("uploads", exist_ok=True)
-            video_file.save(video_path)
-            print(f"Saved file: {video_path}")
-            task = client.task.create(index_id=index_id, file=video_path)
-        elif "url" in request.form:
-            video_url = request.form["url"]
-            print(f"Processing URL: {video_url}")
-            task = client.task.create(index_id=index_id, url=video_url)
-            video_path = video_url
-            filename = video_url.split("/")[-1]
+        if job["task_id"]:
+            # Resuming after a restart: the video is already on Twelve Labs, just keep waiting
+            with telemetry.remote_call("twelvelabs", "task.retrieve"):
+                task = client.task.retrieve(job["task_id"])
+        elif job["source_type"] == "file":
+            if job.get("probe"):
+                jobs.update(job_id, status=PREPROCESSING)
+                with telemetry.span("ingest.preprocess"):
+                    upload_path = preprocess(job["video_path"], job["probe"], target_height=PREPROCESS_TARGET_HEIGHT, trim=PREPROCESS_TRIM)
+                if upload_path != job["video_path"]:
+                    log.info("Preprocessed %s -> %s (%d -> %d bytes)", job["video_path"], upload_path,
+                             os.path.getsize(job["video_path"]), os.path.getsize(upload_path))
+                    # Later timestamps refer to the processed video, so that is what gets played back
+                    job = jobs.update(job_id, video_path=upload_path)
+            with telemetry.remote_call("twelvelabs", "task.create"):
+                task = client.task.create(index_id=index_id, file=job["video_path"])
         else:
-            print("No file or URL provided")
-            return jsonify({"error": "No file or URL provided"}), 400
+            with telemetry.remote_call("twelvelabs", "task.create"):
+                task = client.task.create(index_id=index_id, url=job["video_path"])
+        log.info("Created task: %s", task.id)
+        # The indexing budget covers the wait on Twelve Labs only: not the ingest queue, preprocessing or,
+        # for a resumed job, the time the server was down
+        job = jobs.update(job_id, status=INDEXING, task_id=task.id, progress=task.status, indexing_started_at=time.time())
+
+        deadline = job["indexing_started_at"] + INDEXING_TIMEOUT
 
         def on_task_update(task: Task):
-            print(f"Task {task.id} status: {task.status}")
-
-        print(f"Created task: {task.id}")
-        timeout = 600
-        start_time = time.time()
-        task.wait_for_done(sleep_interval=50, callback=on_task_update)
-        if time.time() - start_time > timeout:
-            print(f"Indexing timed out for task {task.id}")
-            return jsonify({"error": f"Indexing timed out for task {task.id}. Video uploaded to Twelve Labs, please check dashboard."}), 504
+            log.info("Task %s status: %s", task.id, task.status)
+            jobs.update(job_id, progress=task.status)
+            if not task.done and time.time() > deadline:
+                raise TimeoutError(f"Indexing timed out for task {task.id}. Video uploaded to Twelve Labs, please check dashboard.")
+
+        with telemetry.remote_call("twelvelabs", "wait_for_done"):
+            task.wait_for_done(sleep_interval=INDEXING_POLL_INTERVAL, callback=on_task_update)
         if task.status != "ready":
-            print(f"Indexing failed with status {task.status}")
-            return jsonify({"error": f"Indexing failed with status {task.status}. Ensure your video meets requirements (360p-4K, 4s-60min, <2GB, audio track)."}), 500
+            log.warning("Indexing failed with status %s", task.status)
+            jobs.update(job_id, status=FAILED, error=f"Indexing failed with status {task.status}. Ensure your video meets requirements (360p-4K, 4s-60min, <2GB, audio track).")
+            content_index.release(job.get("content_hash"), job_id)
+            return
 
-        print(f"Indexing complete, video_id: {task.video_id}")
-        advice = {"good": [], "bad": [], "improve": []}
-        try:
-            prompt = (
-                "Analyze this Fortnite gameplay video and provide detailed feedback in JSON format with keys 'good', 'bad', and 'improve', each containing a list of up to 5 strings. Focus on specific gameplay elements like aim, building, positioning, decision-making, and resource management. For 'bad' and 'improve', include specific timestamps (e.g., '0:45') where the issue or improvement opportunity occurred. Ensure feedback is precise and tied to specific moments in the video. Example:\n"
-                "{\n"
-                "  \"good\": [\"Accurate aim on headshots at 0:30\", \"Effective building during combat at 1:15\", \"Good positioning on high ground at 2:00\"],\n"
-                "  \"bad\": [\"Missed shots during exchange at 0:45\", \"Poor positioning in storm at 1:30\"],\n"
-                "  \"improve\": [\"Practice quicker building at 1:15 to minimize exposure\", \"Improve situational awareness at 0:45 to avoid ambushes\"]\n"
-                "}\n"
-                "Ensure the response is a valid JSON object."
-            )
-            res = client.analyze(video_id=task.video_id, prompt=prompt)
-            if hasattr(res, "data"):
-                if isinstance(res.data, dict):
-                    advice = res.data
-                elif isinstance(res.data, str):
-                    try:
-                        advice = json.loads(res.data)
-                    except json.JSONDecodeError:
-                        print(f"Non-JSON response: {res.data}")
-                        lines = res.data.split('\n')
-                        for line in lines:
-                            line = line.strip()
-                            if line.startswith("Good:") or line.startswith("- Good:"):
-                                advice["good"].append(line.replace("Good:", "").replace("- Good:", "").strip())
-                            elif line.startswith("Bad:") or line.startswith("- Bad:"):
-                                advice["bad"].append(line.replace("Bad:", "").replace("- Bad:", "").strip())
-                            elif line.startswith("Improve:") or line.startswith("- Improve:"):
-                                advice["improve"].append(line.replace("Improve:", "").replace("- Improve:", "").strip())
-            print(f"Generated advice: {advice}")
-        except Exception as e:
-            print(f"Failed to generate advice: {e}")
-            advice = {
-                "good": ["Analysis failed, unable to evaluate gameplay"],
-                "bad": ["Analysis failed, unable to evaluate gameplay"],
-                "improve": ["Check video requirements (360p-4K, 4s-60min, <2GB, audio) and try again"]
-            }
+        log.info("Indexing complete, video_id: %s", task.video_id)
+        jobs.update(job_id, status=ENRICHING, video_id=task.video_id, progress=None, stages=[])
 
-        try:
-            summary = client.summarize(video_id=task.video_id, type="summary").summary
-            print(f"Generated summary: {summary}")
-        except Exception as e:
-            print(f"Failed to generate summary: {e}")
-            summary = "Summary generation failed"
+        def on_stage_done(name, result, error):
+            current = jobs.get(job_id)
+            jobs.update(job_id, stages=current["stages"] + [name], partial={**current.get("partial", {}), name: result})
 
-        chapters = []
-        try:
-            chapters = [
-                {
-                    "chapter_number": c.chapter_number,
-                    "chapter_title": c.chapter_title,
-                    "chapter_summary": c.chapter_summary,
-                    "start": c.start,
-                    "end": c.end
-                } for c in client.summarize(video_id=task.video_id, type="chapter").chapters
-            ]
-            print(f"Generated chapters: {len(chapters)}")
-        except Exception as e:
-            print(f"Failed to generate chapters: {e}")
+        with telemetry.span("ingest.enrich"):
+            results = enrich_video(task.video_id, job["video_path"], on_stage_done=on_stage_done)
 
-        # Generate thumbnail with Gemini 2.0 Flash
-        thumbnail_url = None
-        try:
-            # model = gemini_client.models.get("gemini-2.0-flash-preview-image-generation")
-            response = gemini_client.models.generate_content(
-                model="gemini-2.0-flash-preview-image-generation",
-                contents=(
-                    f"Generate an image for a Fortnite gameplay video thumbnail with the summary: '{summary}'. "
-                    "Include vibrant colors (#178FDB to #6AE2FD gradient background), SypherPK's Icon Series skin or Chun-Li, "
-                    "and elements like weapons, builds, or loot chests. Make it dynamic, action-packed, with a bold Fortnite aesthetic "
-                    "using 'Luckiest Guy' font style for any text. Ensure the output is an image (400x400 pixels)."
-                ),
-                config=GenerateContentConfig(response_modalities=[Modality.TEXT, Modality.IMAGE])
-            )
-            for part in response.candidates[0].content.parts:
-                if hasattr(part, "text") and part.text:
-                    print(f"Gemini response text: {part.text}")
-                elif hasattr(part, "inline_data") and part.inline_data:
-                    image_data = base64.b64decode(part.inline_data.data)
-                    image = Image.open(BytesIO(image_data))
-                    image = image.resize((400, 400), Image.Resampling.LANCZOS)
-                    thumbnail_path = f"uploads/thumbnail_{video_id}.png"
-                    image.save(thumbnail_path, "PNG")
-                    thumbnail_url = f"http://localhost:5000/{thumbnail_path}"
-                    print(f"Generated thumbnail: {thumbnail_url}")
-                    break
-        except Exception as e:
-            print(f"Failed to generate thumbnail1: {e}")
-
-        videos = load_videos()
         video_metadata = {
             "video_id": task.video_id,
-            "filename": filename,
-            "video_path": video_path,
-            "summary": summary,
-            "chapters": chapters,
-            "advice": advice,
-            "thumbnail_url": thumbnail_url or "http://localhost:5173/placeholder.png"
+            "filename": job["filename"],
+            "video_path": job["video_path"],
+            "summary": results["summary"],
+            "chapters": results["chapters"],
+            "advice": results["advice"],
+            "thumbnail_url": results["thumbnail_url"] or "http://localhost:5173/placeholder.png",
+            "previews": results["previews"]
         }
-        videos.append(video_metadata)
-        save_videos(videos)
-        print(f"Saved metadata to videos.json")
+        catalog.put(video_metadata)
+        log.info("Saved metadata to catalog")
+        search_index.refresh(catalog)
+        if results["previews"]:
+            upgrade_thumbnail_async(task.video_id, results["summary"])
 
-        # Initialize chat history for this video
-        chat_histories[task.video_id] = []
+        # Start a fresh chat for this video
+        chat_sessions.reset(task.video_id)
 
-        return jsonify({
-            "video_id": task.video_id,
-            "video_path": video_path,
-            "advice": advice,
-            "chapters": chapters,
-            "summary": summary,
-            "thumbnail_url": thumbnail_url or "http://localhost:5173/placeholder.png"
-        })
+        content_index.resolve(job.get("content_hash"), job_id, task.video_id)
+        jobs.update(job_id, status=DONE, result=video_metadata)
+    except Exception as e:
+        log.exception("Error in ingest job %s: %s", job_id, e)
+        jobs.update(job_id, status=FAILED, error=f"{str(e)}. Ensure your video meets requirements (360p-4K, 4s-60min, <2GB, audio track).")
+        content_index.release(job.get("content_hash"), job_id)
+
+def start_background_work():
+    """Resume interrupted jobs and start periodic work. Call once in every process that serves requests."""
+    resume_unfinished_jobs()
+    chat_sessions.purge_expired()
+    index_reconciler.start()
+    threading.Thread(target=keep_leases, name="leases", daemon=True).start()
+
+def resume_unfinished_jobs():
+    """Run unfinished jobs no live server process holds, e.g. after a restart."""
+    for job in jobs.unfinished():
+        if jobs.claim(job["job_id"], LEASE_TTL):
+            log.info("Resuming ingest job %s (%s)", job["job_id"], job["status"])
+            ingest_executor.submit(run_ingest, job["job_id"])
+
+def keep_leases():
+    """Renew this process's leases and pick up jobs whose process went away."""
+    while True:
+        time.sleep(LEASE_TTL / 3)
+        try:
+            db.renew_leases(LEASE_TTL)
+            resume_unfinished_jobs()
+        except Exception as e:
+            log.exception("Lease renewal failed: %s", e)
+
+def join_duplicate(holder, spool=None):
+    """Response for an upload whose content a catalog video or a running ingest job already holds."""
+    telemetry.cache_lookup("upload_dedupe", True)
+    if spool is not None:
+        discard_upload(spool)
+    video = catalog.get(holder["video_id"]) if holder["video_id"] else None
+    if video:
+        log.info("Duplicate upload %s, reusing video_id %s", holder["content_hash"], video["video_id"])
+        return {"job_id": holder["job_id"], "status": DONE, "duplicate": True, "result": video}, 200
+    # Same content is already being indexed, follow that job instead of starting another
+    job = jobs.get(holder["job_id"])
+    log.info("Duplicate upload %s, joining job %s", holder["content_hash"], job["job_id"])
+    return {"job_id": job["job_id"], "status": job["status"], "duplicate": True}, 202
+
+def queue_upload(spool=None, original_filename=None, url=None, force=False):
+    """Start ingesting an uploaded file (spooled by HashingRequest) or a URL. Returns ``(payload, status)``.
+
+    Shared by the Flask and ASGI upload routes.
+    """
+    if not index_id:
+        log.error("No valid index_id")
+        if spool is not None:
+            discard_upload(spool)
+        return {"error": "No valid index_id. Please verify the index ID in server.py and Twelve Labs dashboard."}, 500
+
+    if spool is not None:
+        filename = urllib.parse.quote(original_filename)
+        content_hash = spool.hexdigest()
+        video_path = None
+        source_type = "file"
+    else:
+        video_path = url
+        log.info("Processing URL: %s", video_path)
+        filename = video_path.split("/")[-1]
+        content_hash = url_content_hash(video_path)
+        source_type = "url"
+
+    holder = None if force else content_index.holder(content_hash)
+    if holder:
+        return join_duplicate(holder, spool)
+
+    info = None
+    if source_type == "file":
+        # Reject videos indexing would refuse before anything is uploaded to Twelve Labs
+        spool.flush()
+        try:
+            with telemetry.span("upload.probe"):
+                info = probe(spool.name)
+                validate(info)
+        except PreprocessError as e:
+            log.warning("Rejected upload %s: %s", filename, e)
+            discard_upload(spool)
+            return {"error": f"{str(e)} Ensure your video meets requirements (360p-4K, 4s-60min, <2GB, audio track)."}, 400
+        with telemetry.span("upload.commit"):
+            content_hash, video_path = commit_upload(spool, "uploads", original_filename)
+        log.info("Saved file: %s", video_path)
+
+    with db.transaction() as conn:
+        # Checked again under the write lock: a concurrent upload of the same content may have claimed it since
+        holder = None if force else content_index.holder(content_hash, conn)
+        if holder is None:
+            job = jobs.create(conn, source_type=source_type, video_path=video_path, filename=filename,
+                              content_hash=content_hash, probe=info, trace_id=telemetry.trace_id_var.get())
+            content_index.claim(content_hash, job["job_id"], conn)
+    if holder:
+        return join_duplicate(holder, spool)
+    telemetry.cache_lookup("upload_dedupe", False)
+    # Another process's resume scan may have claimed it first, in which case that process runs it
+    if jobs.claim(job["job_id"], LEASE_TTL):
+        ingest_executor.submit(run_ingest, job["job_id"])
+    log.info("Queued ingest job: %s", job["job_id"])
+    return {"job_id": job["job_id"], "status": job["status"]}, 202
+
+@app.route("/api/upload", methods=["POST"])
+def upload_video():
+    try:
+        log.info("Received upload request")
+        # Reading the form spools (and hashes) the whole body
+        with telemetry.span("upload.receive"):
+            files = request.files
+        force = request.values.get("force", "").lower() == "true"
+        if "file" in files:
+            video_file = files["file"]
+            payload, status = queue_upload(spool=video_file.stream, original_filename=video_file.filename, force=force)
+        elif "url" in request.form:
+            payload, status = queue_upload(url=request.form["url"], force=force)
+        else:
+            log.warning("No file or URL provided")
+            return jsonify({"error": "No file or URL provided"}), 400
+        return jsonify(payload), status
 
     except Exception as e:
-        print(f"Error in upload_video: {str(e)}")
+        log.exception("Error in upload_video: %s", e)
         return jsonify({"error": f"{str(e)}. Ensure your video meets requirements (360p-4K, 4s-60min, <2GB, audio track)."}), 500
 
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify(job)
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """Server-Sent Events stream of a job: one ``job`` event per status, progress or stage change."""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+
+    def stream():
+        current = job
+        yield sse("job", current)
+        while current["status"] not in TERMINAL_STATES:
+            changed = jobs.wait_for_update(job_id, current["updated_at"], timeout=15)
+            if changed is None:
+                yield ": keep-alive\n\n"
+                continue
+            current = changed
+            yield sse("job", current)
+
+    return sse_response(stream())
+
+SYNC_STAGES = ("summary", "previews", "thumbnail_url")
+SYNC_FALLBACKS = {"summary": "Summary not generated", "previews": None, "thumbnail_url": "http://localhost:5173/placeholder.png"}
+
+def sync_stages(video_id, record, retry=None):
+    """Summary, local previews and thumbnail stages for one synced video, named ``<video_id>:<stage>``.
+
+    With ``retry``, only those stages run; the others pass on the record's current values.
+    """
+    def stage(name, fn, deps=()):
+        if retry is not None and name not in retry:
+            return Stage(f"{video_id}:{name}", lambda *_: record.get(name), deps=deps)
+        return Stage(f"{video_id}:{name}", fn, deps=deps, timeout=ENRICHMENT_STAGE_TIMEOUT, fallback=SYNC_FALLBACKS[name])
+
+    return [
+        stage("summary", lambda: generate_summary(video_id)),
+        stage("previews", lambda: render_local_previews(video_id, record["video_path"], record.get("chapters") or [])),
+        stage("thumbnail_url", lambda summary, previews: pick_thumbnail(video_id, summary, previews),
+              deps=[f"{video_id}:summary", f"{video_id}:previews"]),
+    ]
+
+def sync_index():
+    """Pull videos added to the Twelve Labs index since the last sync into the catalog."""
+    state = catalog.get_meta("index_sync")
+    # Videos an ingest job is still enriching get their full record from that job
+    ingesting = jobs.active_video_ids()
+    new_videos = []
+    page = 1
+    while True:
+        with telemetry.remote_call("twelvelabs", "index.video.list"):
+            batch = list(client.index.video.list(index_id=index_id, page=page, page_limit=INDEX_SYNC_PAGE_LIMIT,
+                                                 sort_by="created_at", sort_option="desc"))
+        fresh = [video for video in batch if video.id not in catalog and video.id not in ingesting]
+        new_videos.extend(fresh)
+        # Newest first: once a whole page is already known, the rest was covered by an earlier sync
+        if len(batch) < INDEX_SYNC_PAGE_LIMIT or (state and not fresh):
+            break
+        page += 1
+    log.info("Index sync found %d new videos", len(new_videos))
+
+    records = {
+        video.id: {
+            "video_id": video.id,
+            "filename": video.metadata.filename if video.metadata else "Unknown",
+            "video_path": video.source_url if video.source_url else f"uploads/{video.metadata.filename if video.metadata else video.id}",
+            "chapters": [],
+            "advice": {"good": [], "bad": [], "improve": []},
+        } for video in new_videos
+    }
+
+    # Videos whose summary or thumbnail fell back in an earlier sync get another try
+    retries = {video["video_id"]: video for video in catalog.needing_retry()}
+    if retries:
+        log.info("Index sync retrying %d videos", len(retries))
+
+    # Summaries and thumbnails for every video run as one graph on the enrichment pool
+    stages = []
+    for video_id, record in {**retries, **records}.items():
+        stages.extend(sync_stages(video_id, record, retry=record.get("retry_stages")))
+    failed = set()
+    results = run_stages(stages, enrichment_executor, max_in_flight=INDEX_SYNC_CONCURRENCY,
+                         on_stage_done=lambda name, result, error: error is not None and failed.add(name))
+
+    for video_id, record in {**retries, **records}.items():
+        fields = {}
+        retry_stages = []
+        for stage in record.get("retry_stages") or SYNC_STAGES:
+            if f"{video_id}:{stage}" in failed:
+                retry_stages.append(stage)
+            else:
+                fields[stage] = results[f"{video_id}:{stage}"]
+        if "thumbnail_url" in fields:
+            fields["thumbnail_url"] = fields["thumbnail_url"] or "http://localhost:5173/placeholder.png"
+        if video_id in records:
+            # Fallbacks are stored so the video shows up now, and retry_stages marks them for the next sync
+            record.update({stage: SYNC_FALLBACKS[stage] for stage in retry_stages}, **fields, retry_stages=retry_stages)
+            # add() rather than put(): an ingest job may have stored a richer record for this video meanwhile
+            if catalog.add(record) and record["previews"]:
+                upgrade_thumbnail_async(video_id, record["summary"])
+        else:
+            catalog.update(video_id, **fields, retry_stages=retry_stages)
+            if fields.get("previews"):
+                upgrade_thumbnail_async(video_id, fields.get("summary", record["summary"]))
+    catalog.set_meta("index_sync", {"last_synced_at": time.time(), "new_videos": len(new_videos)})
+    search_index.refresh(catalog)
+
+def claim_index_sync(requested):
+    """Whether this process runs the next sync: one process at a time, and periodic syncs only if no process synced lately."""
+    state = catalog.get_meta("index_sync")
+    if not requested and state and time.time() - state["last_synced_at"] < INDEX_SYNC_INTERVAL / 2:
+        return False
+    return db.acquire_lease("index_sync", LEASE_TTL)
+
+def run_index_sync():
+    try:
+        sync_index()
+    finally:
+        db.release_lease("index_sync")
+
+index_reconciler = IndexReconciler(run_index_sync, INDEX_SYNC_INTERVAL, should_run=claim_index_sync)
+
+def catalog_etag(query_string):
+    """Validator for a catalog listing: changes whenever the catalog or the query does."""
+    return hashlib.sha1(f"{catalog.version()}:{query_string}".encode()).hexdigest()
+
+def page_limit(limit):
+    return max(1, min(limit or VIDEOS_PAGE_SIZE, VIDEOS_PAGE_MAX))
+
+def project(video, fields):
+    return {key: video[key] for key in fields if key in video} if fields else video
+
 @app.route("/api/videos", methods=["GET"])
 def get_videos():
+    """List the catalog without touching Twelve Labs.
+
+    Supports ``?cursor=&limit=`` pagination (VIDEOS_PAGE_SIZE records by
+    default, at most VIDEOS_PAGE_MAX; the next cursor comes back in
+    ``X-Next-Cursor``), ``?fields=a,b`` projection and ``If-None-Match``.
+    """
     try:
-        print("Fetching videos")
-        videos = load_videos()
-        # Sync with Twelve Labs index
-        try:
-            index_videos = client.index.video.list(index_id=index_id)
-            for video in index_videos:
-                if not any(v["video_id"] == video.id for v in videos):
-                    summary = "Summary not generated"
-                    try:
-                        summary = client.summarize(video_id=video.id, type="summary").summary
-                    except Exception as e:
-                        print(f"Failed to generate summary for video {video.id}: {e}")
-                    # Generate thumbnail for new videos
-                    thumbnail_url = None
-                    try:
-                        # model = gemini_client.models.get("gemini-2.0-flash-preview-image-generation")
-                        response = gemini_client.models.generate_content(
-                            model="gemini-2.0-flash-preview-image-generation",
-                            contents=(
-                                f"Generate an image for a Fortnite gameplay video thumbnail with the summary: '{summary}'. "
-                                "Include vibrant colors (#178FDB to #6AE2FD gradient background), SypherPK's Icon Series skin or Chun-Li, "
-                                "and elements like weapons, builds, or loot chests. Make it dynamic, action-packed, with a bold Fortnite aesthetic "
-                                "using 'Luckiest Guy' font style for any text. Ensure the output is an image (400x400 pixels)."
-                            ),
-                            config=GenerateContentConfig(response_modalities=[Modality.TEXT, Modality.IMAGE])
-                        )
-                        for part in response.candidates[0].content.parts:
-                            if hasattr(part, "text") and part.text:
-                                print(f"Gemini response text: {part.text}")
-                            elif hasattr(part, "inline_data") and part.inline_data:
-                                image_data = base64.b64decode(part.inline_data.data)
-                                image = Image.open(BytesIO(image_data))
-                                image = image.resize((400, 400), Image.Resampling.LANCZOS)
-                                thumbnail_path = f"uploads/thumbnail_{video_id}.png"
-                                image.save(thumbnail_path, "PNG")
-                                thumbnail_url = f"http://localhost:5000/{thumbnail_path}"
-                                print(f"Generated thumbnail: {thumbnail_url}")
-                                break
-                    except Exception as e:
-                        print(f"Failed to generate thumbnail for video {video.id}: {e}")
-                    videos.append({
-                        "video_id": video.id,
-                        "filename": video.metadata.filename if video.metadata else "Unknown",
-                        "video_path": video.source_url if video.source_url else f"uploads/{video.metadata.filename if video.metadata else video.id}",
-                        "summary": summary,
-                        "chapters": [],
-                        "advice": {"good": [], "bad": [], "improve": []},
-                        "thumbnail_url": thumbnail_url or "http://localhost:5173/placeholder.png"
-                    })
-            save_videos(videos)
-        except Exception as e:
-            print(f"Failed to fetch videos from Twelve Labs: {e}")
-        return jsonify(videos)
+        etag = catalog_etag(request.query_string.decode())
+        telemetry.cache_lookup("catalog_etag", etag in request.if_none_match)
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            cursor = request.args.get("cursor", default=0, type=int)
+            limit = page_limit(request.args.get("limit", type=int))
+            fields = [f for f in request.args.get("fields", "").split(",") if f]
+            videos, next_cursor = catalog.page(after=cursor, limit=limit)
+            response = jsonify([project(video, fields) for video in videos])
+            if next_cursor is not None:
+                response.headers["X-Next-Cursor"] = str(next_cursor)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        if catalog.get_meta("index_sync") is None:
+            index_reconciler.trigger()
+        return response
     except Exception as e:
-        print(f"Error in get_videos: {str(e)}")
+        log.exception("Error in get_videos: %s", e)
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/videos/<video_id>", methods=["GET"])
+def get_video(video_id):
+    video = catalog.get(video_id)
+    if not video:
+        return jsonify({"error": f"Unknown video {video_id}"}), 404
+    return jsonify(video)
+
+@app.route("/api/search", methods=["GET"])
+def search():
+    """Ranked moments for ``?q=``, optionally narrowed by ``video_id`` and a ``start``/``end`` window in seconds."""
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Missing q"}), 400
+    return jsonify(search_catalog(
+        query,
+        limit=request.args.get("limit", default=20, type=int),
+        video_id=request.args.get("video_id"),
+        start=request.args.get("start", type=float),
+        end=request.args.get("end", type=float),
+    ))
+
+def search_catalog(query, limit=20, video_id=None, start=None, end=None):
+    started = time.perf_counter()
+    search_index.refresh(catalog)
+    results = search_index.search(query, limit=min(limit, 100), video_id=video_id, start=start, end=end)
+    return {"query": query, "results": results, "took_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+@app.route("/api/videos/sync", methods=["POST"])
+def trigger_sync():
+    index_reconciler.trigger()
+    return jsonify({"sync": index_reconciler.status(), "last_sync": catalog.get_meta("index_sync")}), 202
+
 @app.route("/uploads/<path:filename>", methods=["GET"])
 def serve_video(filename):
-    print(f"Serving video: {filename}")
-    return send_from_directory("uploads", filename)
+    """Serve uploads with strong ETags and Range support.
+
+    Thumbnails and posters are served as WebP or JPEG variants picked by
+    ``Accept`` and ``?w=``. Responses are cached as immutable when the URL
+    pins the content: content-addressed uploads, or ``?v=`` matching the
+    file's current version. Everything else must revalidate.
+    """
+    path = safe_join("uploads", filename)
+    if not path or not os.path.isfile(path):
+        return jsonify({"error": f"File not found: {filename}"}), 404
+
+    resizable = assets.is_resizable(filename)
+    served_path = path
+    if resizable:
+        served_path = assets.pick_variant(path, width=request.args.get("w", type=int),
+                                          accept_webp=request.accept_mimetypes["image/webp"] > 0)
+
+    etag = assets.etag(served_path)
+    telemetry.cache_lookup("uploads_etag", etag in request.if_none_match)
+    # send_file resolves relative paths against app.root_path, not the working directory checked above
+    response = send_file(os.path.abspath(served_path), etag=etag, conditional=True)
+    if assets.is_immutable(filename, path, request.args.get("v")):
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    if resizable:
+        response.vary.add("Accept")
+    return response
+
+CHAT_FALLBACK_RESPONSE = "Yo, what are we doing? Couldn't get a good read on that clip!"
+
+def parse_chat_request(data):
+    """Return ``(video_id, message, summary, error)`` for a chat request body, ``error`` being ``(payload, status)``."""
+    video_id = data.get("video_id")
+    message = data.get("message")
+    summary = data.get("summary")
+
+    if not video_id or not message or not summary:
+        log.warning("Missing video_id, message, or summary")
+        return None, None, None, ({"error": "Missing video_id, message, or summary"}, 400)
+
+    if not client:
+        log.error("Twelve Labs client not initialized")
+        return None, None, None, ({"error": "Twelve Labs client not initialized"}, 500)
+
+    return video_id, message, summary, None
+
+def build_chat_prompt(video_id, message, summary):
+    # Prepare SypherPK persona prompt
+    return (
+        "You are SypherPK (Ali Hassan), a Fortnite YouTuber and streamer known for being an educational entertainer, entrepreneur, and community builder. You teach Fortnite strategies (building, editing, aiming) in an insightful and entertaining way, breaking down complex gameplay into easy lessons. You're authentic, relatable, and self-aware, often joking about your 'crooked fingers,' snacking on stream, and your dogs Aegon, Aiko, and Yuna. You're obsessed with the Chun-Li Fortnite skin, and fans love memeing about it, saying you love Chun-Li more than your wife and pushing your creator code 'SypherPK' for Chun-Li. You're the founder of Oni Studios, supporting Fortnite Creative content. Respond to the following question about this Fortnite clip with the summary: '{summary}'. Use casual language like 'bro,' 'nasty clip' for good plays, 'yo what are we doing' for bad plays, and reference your traits (e.g., Chun-Li, dogs, snacking). Keep responses concise, strategic, and fun, like you're coaching a fan. Use the video's indexed data to provide specific advice tied to gameplay moments with timestamps where possible. Previous chat history: {chat_history}\n\nQuestion: {message}"
+    ).format(
+        summary=summary,
+        chat_history=chat_sessions.prompt_history(video_id),
+        message=message
+    )
+
+def complete_chat(video_id, message, summary):
+    """Answer one chat message and record it. Returns ``{"response", "history"}``."""
+    prompt = build_chat_prompt(video_id, message, summary)
+
+    # Call Twelve Labs analyze
+    with telemetry.remote_call("twelvelabs", "analyze"):
+        response = client.analyze(video_id=video_id, prompt=prompt)
+    ai_response = response.data if hasattr(response, "data") else "Sorry, bro, couldn't analyze that. Try again!"
+
+    if isinstance(ai_response, dict):
+        ai_response = json.dumps(ai_response)
+    elif isinstance(ai_response, str):
+        # Clean up if response is not conversational
+        ai_response = clean_response(ai_response) or CHAT_FALLBACK_RESPONSE
+
+    # Store in chat history
+    history = chat_sessions.append(video_id, message, ai_response)
+
+    log.debug("Chat response for video_id %s: %s", video_id, ai_response)
+    return {"response": ai_response, "history": history}
 
 @app.route("/api/chat", methods=["POST"])
 def chat():
     try:
-        data = request.get_json()
-        video_id = data.get("video_id")
-        message = data.get("message")
-        summary = data.get("summary")
-
-        if not video_id or not message or not summary:
-            print("Missing video_id, message, or summary")
-            return jsonify({"error": "Missing video_id, message, or summary"}), 400
-
-        if not client:
-            print("Twelve Labs client not initialized")
-            return jsonify({"error": "Twelve Labs client not initialized"}), 500
-
-        # Initialize chat history if not exists
-        if video_id not in chat_histories:
-            chat_histories[video_id] = []
-
-        # Prepare SypherPK persona prompt
-        prompt = (
-            "You are SypherPK (Ali Hassan), a Fortnite YouTuber and streamer known for being an educational entertainer, entrepreneur, and community builder. You teach Fortnite strategies (building, editing, aiming) in an insightful and entertaining way, breaking down complex gameplay into easy lessons. You're authentic, relatable, and self-aware, often joking about your 'crooked fingers,' snacking on stream, and your dogs Aegon, Aiko, and Yuna. You're obsessed with the Chun-Li Fortnite skin, and fans love memeing about it, saying you love Chun-Li more than your wife and pushing your creator code 'SypherPK' for Chun-Li. You're the founder of Oni Studios, supporting Fortnite Creative content. Respond to the following question about this Fortnite clip with the summary: '{summary}'. Use casual language like 'bro,' 'nasty clip' for good plays, 'yo what are we doing' for bad plays, and reference your traits (e.g., Chun-Li, dogs, snacking). Keep responses concise, strategic, and fun, like you're coaching a fan. Use the video's indexed data to provide specific advice tied to gameplay moments with timestamps where possible. Previous chat history: {chat_history}\n\nQuestion: {message}"
-        ).format(
-            summary=summary,
-            chat_history=json.dumps(chat_histories[video_id]),
-            message=message
-        )
-
-        # Call Twelve Labs analyze
-        response = client.analyze(video_id=video_id, prompt=prompt)
-        ai_response = response.data if hasattr(response, "data") else "Sorry, bro, couldn't analyze that. Try again!"
-
-        if isinstance(ai_response, dict):
-            ai_response = json.dumps(ai_response)
-        elif isinstance(ai_response, str):
-            # Clean up if response is not conversational
-            lines = ai_response.split('\n')
-            cleaned_response = []
-            for line in lines:
-                line = line.strip()
-                if line and not line.startswith(("#", "-", "*")):
-                    cleaned_response.append(line)
-            ai_response = " ".join(cleaned_response) if cleaned_response else "Yo, what are we doing? Couldn't get a good read on that clip!"
-
-        # Store in chat history
-        chat_histories[video_id].append({"user": message, "ai": ai_response})
-
-        print(f"Chat response for video_id {video_id}: {ai_response}")
-        return jsonify({"response": ai_response, "history": chat_histories[video_id]})
+        video_id, message, summary, error = parse_chat_request(request.get_json())
+        if error:
+            return jsonify(error[0]), error[1]
+        return jsonify(complete_chat(video_id, message, summary))
 
     except Exception as e:
-        print(f"Error in chat: {str(e)}")
+        log.exception("Error in chat: %s", e)
         return jsonify({"error": f"Chat error: {str(e)}"}), 500
 
+def stream_analyze(video_id, prompt):
+    """Yield response text chunks as Twelve Labs generates them."""
+    if not hasattr(client, "analyze_stream"):
+        # Older SDKs have no streaming call, so the whole response arrives as one chunk
+        with telemetry.remote_call("twelvelabs", "analyze"):
+            response = client.analyze(video_id=video_id, prompt=prompt)
+        data = response.data if hasattr(response, "data") else ""
+        yield json.dumps(data) if isinstance(data, dict) else data
+        return
+    # Spans the whole stream, so callers iterate it through telemetry.bind_iter
+    with telemetry.remote_call("twelvelabs", "analyze_stream"):
+        for event in client.analyze_stream(video_id=video_id, prompt=prompt):
+            # The SDK yields the text of each text_generation event; older builds yielded the event itself
+            text = event if isinstance(event, str) else getattr(event, "text", None)
+            if text:
+                yield text
+
+def chat_events(video_id, message, summary):
+    """SSE stream for one chat message: ``token`` events as text arrives, then one ``done`` event with the history."""
+    cleaner = ResponseCleaner()
+    parts = []
+    try:
+        prompt = build_chat_prompt(video_id, message, summary)
+        for chunk in stream_analyze(video_id, prompt):
+            text = cleaner.feed(chunk)
+            if text:
+                parts.append(text)
+                yield sse("token", {"text": text})
+    except Exception as e:
+        log.exception("Error in chat stream: %s", e)
+        yield sse("error", {"error": f"Chat error: {str(e)}"})
+        return
+    ai_response = "".join(parts)
+    if not ai_response:
+        ai_response = CHAT_FALLBACK_RESPONSE
+        yield sse("token", {"text": ai_response})
+    history = chat_sessions.append(video_id, message, ai_response)
+    log.debug("Chat response for video_id %s: %s", video_id, ai_response)
+    yield sse("done", {"response": ai_response, "history": history})
+
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream():
+    """Streaming /api/chat, see chat_events()."""
+    video_id, message, summary, error = parse_chat_request(request.get_json())
+    if error:
+        return jsonify(error[0]), error[1]
+    return sse_response(telemetry.bind_iter(chat_events(video_id, message, summary)))
+
+def refresh_thumbnail(video_id, summary, force=False):
+    """Return ``{"image_url", "error"}`` for a video, generating a thumbnail if it has none yet (or ``force``)."""
+    # Already generated (e.g. by another tab): serve it instead of asking Gemini again
+    video = catalog.get(video_id)
+    existing = video and video.get("thumbnail_url") not in (None, "http://localhost:5173/placeholder.png")
+    if not force:
+        telemetry.cache_lookup("thumbnail", existing)
+    if existing and not force:
+        return {"image_url": video["thumbnail_url"], "error": None}
+
+    # A poster from the video's own frames takes milliseconds; Gemini art follows in the background
+    if video and not force and os.path.exists(video.get("video_path") or ""):
+        previews = render_local_previews(video_id, video.get("video_path"), video.get("chapters"))
+        if previews:
+            catalog.update(video_id, thumbnail_url=previews["poster_url"], previews=previews)
+            upgrade_thumbnail_async(video_id, summary)
+            return {"image_url": previews["poster_url"], "error": None}
+
+    try:
+        thumbnail_url = generate_thumbnail(video_id, summary)
+    except ThumbnailError as e:
+        log.warning("Failed to generate thumbnail for video %s: %s", video_id, e)
+        return {"image_url": "http://localhost:5173/placeholder.png", "error": str(e)}
+
+    catalog.update(video_id, thumbnail_url=thumbnail_url)
+    return {"image_url": thumbnail_url, "error": None}
+
 @app.route("/api/generate-image", methods=["POST"])
 def generate_image():
     try:
         data = request.get_json()
         video_id = data.get("video_id")
-        summary = data.get("summary", "Fortnite gameplay")
 
         if not video_id:
-            print("Missing video_id")
+            log.warning("Missing video_id")
             return jsonify({"error": "Missing video_id"}), 400
 
-        thumbnail_url = None
-        try:
-            # model = gemini_client.models.get("gemini-2.0-flash-preview-image-generation")
-            response = gemini_client.models.generate_content(
-                model="gemini-2.0-flash-preview-image-generation",
-                contents=(
-                    f"Generate an image for a Fortnite gameplay video thumbnail with the summary: '{summary}'. "
-                    "Include vibrant colors (#178FDB to #6AE2FD gradient background), SypherPK's Icon Series skin or Chun-Li, "
-                    "and elements like weapons, builds, or loot chests. Make it dynamic, action-packed, with a bold Fortnite aesthetic "
-                    "using 'Luckiest Guy' font style for any text. Ensure the output is an image (400x400 pixels)."
-                ),
-                config=GenerateContentConfig(response_modalities=[Modality.TEXT, Modality.IMAGE])
-            )
-            for part in response.candidates[0].content.parts:
-                if hasattr(part, "text") and part.text:
-                    print(f"Gemini response text: {part.text}")
-                elif hasattr(part, "inline_data") and part.inline_data:
-                    image_data = base64.b64decode(part.inline_data.data)
-                    image = Image.open(BytesIO(image_data))
-                    image = image.resize((400, 400), Image.Resampling.LANCZOS)
-                    thumbnail_path = f"uploads/thumbnail_{video_id}.png"
-                    image.save(thumbnail_path, "PNG")
-                    thumbnail_url = f"http://localhost:5000/{thumbnail_path}"
-                    print(f"Generated thumbnail: {thumbnail_url}")
-                    break
-            if not thumbnail_url:
-                raise ValueError("No image data in response")
-        except Exception as e:
-            print(f"Failed to generate thumbnail2: {str(e)}")
-            thumbnail_url = "http://localhost:5173/placeholder.png"
-
-        # Update videos.json
-        videos = load_videos()
-        for video in videos:
-            if video["video_id"] == video_id:
-                video["thumbnail_url"] = thumbnail_url
-                break
-        save_videos(videos)
-
-        return jsonify({"image_url": thumbnail_url, "error": None if thumbnail_url != "http://localhost:5173/placeholder.png" else str(e)})
+        return jsonify(refresh_thumbnail(video_id, data.get("summary", "Fortnite gameplay"), force=data.get("force")))
 
     except Exception as e:
-        print(f"Error in generate_image: {str(e)}")
+        log.exception("Error in generate_image: %s", e)
         return jsonify({"error": str(e), "image_url": "http://localhost:5173/placeholder.png"}), 500
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition of request, remote call, span and cache metrics."""
+    return app.response_class(telemetry.render(), content_type=telemetry.CONTENT_TYPE)
+
+@app.route("/api/traces/<trace_id>", methods=["GET"])
+def get_trace(trace_id):
+    """Recent spans of one trace (an ``X-Request-ID``), including the ingest job an upload started."""
+    spans = telemetry.spans_for(trace_id)
+    if not spans:
+        return jsonify({"error": f"Unknown trace {trace_id}"}), 404
+    return jsonify({"trace_id": trace_id, "spans": sorted(spans, key=lambda span: span["start"])})
+
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # Only the reloader's child process serves requests, so only it runs background work
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_work()
+    app.run(debug=True, port=int(os.getenv("PORT", "5000")))
\ No newline at end of file
@@ -0,0 +1,206 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import telemetry
+
+
+class Database:
+    """SQLite database in WAL mode with one connection per thread.
+
+    WAL lets readers run alongside a writer, so several server workers
+    (threads or processes) can share the same catalog file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        # Identifies this process as the holder of leases, see acquire_lease()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            # Autocommit mode, transactions are opened explicitly in transaction()
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction that takes the database lock up front, so read-modify-write is atomic."""
+        conn = self.connection()
+        # Includes the wait for the write lock, which other workers may hold
+        with telemetry.span("db.write"):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def acquire_lease(self, name, ttl):
+        """Take the lease ``name`` for ``ttl`` seconds. Returns False while it is held, by any process.
+
+        Leases let one of several server workers own a piece of background
+        work. The holder keeps it with renew_leases() until release_lease();
+        a lease whose holder stops renewing it can be taken over.
+        """
+        now = time.time()
+        cursor = self.execute(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at"
+            " WHERE leases.expires_at < ?",
+            (name, self.owner, now + ttl, now),
+        )
+        return cursor.rowcount > 0
+
+    def renew_leases(self, ttl):
+        """Extend every lease held by this process."""
+        self.execute("UPDATE leases SET expires_at = ? WHERE owner = ?", (time.time() + ttl, self.owner))
+
+    def release_lease(self, name):
+        self.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.owner))
+
+
+class VideoStore:
+    """Video metadata keyed by video_id, kept in insertion order for listing.
+
+    Every write bumps a catalog version number, which callers can use as a
+    cheap validator for cached listings.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " video_id TEXT NOT NULL UNIQUE,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _bump_version(self, conn):
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('version', '1')"
+            " ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    def version(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row["value"]) if row else 0
+
+    def get_meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row["value"]) if row else None
+
+    def set_meta(self, key, value):
+        self.db.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value)),
+        )
+
+    def get(self, video_id):
+        row = self.db.execute("SELECT data FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def __contains__(self, video_id):
+        return self.db.execute("SELECT 1 FROM videos WHERE video_id = ?", (video_id,)).fetchone() is not None
+
+    def put(self, video):
+        """Insert or replace a video record, keeping its original position if it already exists."""
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO videos (video_id, data, updated_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(video_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                (video["video_id"], json.dumps(video), time.time()),
+            )
+            self._bump_version(conn)
+
+    def add(self, video):
+        """Insert a video record only if its video_id is new. Returns True if it was inserted."""
+        with self.db.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO videos (video_id, data, updated_at) VALUES (?, ?, ?)",
+                (video["video_id"], json.dumps(video), time.time()),
+            )
+            if cursor.rowcount:
+                self._bump_version(conn)
+            return cursor.rowcount > 0
+
+    def update(self, video_id, **fields):
+        """Merge ``fields`` into an existing record. Returns the updated record, or None if unknown."""
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT data FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+            if not row:
+                return None
+            video = json.loads(row["data"])
+            video.update(fields)
+            conn.execute(
+                "UPDATE videos SET data = ?, updated_at = ? WHERE video_id = ?",
+                (json.dumps(video), time.time(), video_id),
+            )
+            self._bump_version(conn)
+            return video
+
+    def page(self, after=0, limit=None):
+        """Return ``(videos, next_cursor)`` for records after cursor ``after``.
+
+        ``next_cursor`` is None once the end of the catalog has been reached.
+        """
+        rows = self.db.execute(
+            "SELECT seq, data FROM videos WHERE seq > ? ORDER BY seq LIMIT ?",
+            (after, -1 if limit is None else limit),
+        ).fetchall()
+        next_cursor = rows[-1]["seq"] if limit is not None and len(rows) == limit else None
+        return [json.loads(row["data"]) for row in rows], next_cursor
+
+    def needing_retry(self):
+        """Records with enrichment stages that fell back and should be run again (``retry_stages``)."""
+        rows = self.db.execute(
+            "SELECT data FROM videos WHERE json_array_length(json_extract(data, '$.retry_stages')) > 0 ORDER BY seq"
+        ).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def changed_since(self, updated_at):
+        """Return ``[(video, updated_at)]`` for records written at or after ``updated_at``, oldest first."""
+        rows = self.db.execute(
+            "SELECT data, updated_at FROM videos WHERE updated_at >= ? ORDER BY updated_at", (updated_at,)
+        ).fetchall()
+        return [(json.loads(row["data"]), row["updated_at"]) for row in rows]
+
+    def import_json(self, path):
+        """One-time import of a legacy videos.json file. Returns the number of records imported."""
+        with self.db.transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'imported_json'").fetchone():
+                return 0
+            try:
+                with open(path, "r") as f:
+                    videos = json.load(f)
+            except FileNotFoundError:
+                videos = []
+            now = time.time()
+            conn.executemany(
+                "INSERT OR IGNORE INTO videos (video_id, data, updated_at) VALUES (?, ?, ?)",
+                [(v["video_id"], json.dumps(v), now) for v in videos],
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('imported_json', ?)", (json.dumps(os.path.abspath(path)),))
+            self._bump_version(conn)
+            return len(videos)
@@ -0,0 +1,59 @@
+import json
+
+from flask import Response, stream_with_context
+
+
+def sse(event, data):
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_response(stream):
+    return Response(stream_with_context(stream), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
+class ResponseCleaner:
+    """Incremental version of the chat response cleanup.
+
+    Lines are stripped, lines starting with ``#``, ``-`` or ``*`` are dropped
+    and the rest are joined with single spaces. Text is fed in as it streams
+    and whatever is already known to survive the cleanup is returned right
+    away, so the joined output equals cleaning the full response at once.
+    """
+
+    def __init__(self):
+        self.line_state = None  # None at the start of a line, then "keep" or "drop"
+        self.pending_space = ""
+        self.emitted = False
+
+    def feed(self, text):
+        out = []
+        for ch in text:
+            if ch == "\n":
+                self.line_state = None
+                self.pending_space = ""
+            elif self.line_state is None:
+                if ch.isspace():
+                    continue
+                self.line_state = "drop" if ch in "#-*" else "keep"
+                if self.line_state == "keep":
+                    if self.emitted:
+                        out.append(" ")
+                    out.append(ch)
+                    self.emitted = True
+            elif self.line_state == "keep":
+                # Hold whitespace back until we know it isn't trailing
+                if ch.isspace():
+                    self.pending_space += ch
+                else:
+                    out.append(self.pending_space)
+                    out.append(ch)
+                    self.pending_space = ""
+        return "".join(out)
+
+
+def clean_response(text):
+    return ResponseCleaner().feed(text)
@@ -0,0 +1,274 @@
+"""Metrics, trace spans and logging for the server.
+
+Metrics are plain in-process counters, gauges and histograms rendered in
+the Prometheus text format by ``render()``. Every request gets a trace id
+(the incoming ``X-Request-ID`` or a new one), carried in a context
+variable, so spans and log lines anywhere in the request, and in the
+ingest job it starts, can be tied back to it. Finished spans are observed
+into ``span_duration_seconds`` and kept in a small ring buffer for lookup
+by trace id. Recording is a lock and a few additions, cheap enough to
+leave on.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# Seconds; remote calls and ingest stages run up to minutes, cache hits well under a millisecond
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "5000"))
+
+trace_id_var = contextvars.ContextVar("trace_id", default=None)
+span_id_var = contextvars.ContextVar("span_id", default=None)
+
+_registry = []
+_spans = deque(maxlen=TRACE_BUFFER)
+log = logging.getLogger("telemetry")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}  # label values -> value
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def collect(self):
+        """``[(label values, value)]`` to render."""
+        with self.lock:
+            return list(self.values.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for key, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        """With ``fn``, the value is read at scrape time: a number, or ``{label values: number}``."""
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def collect(self):
+        if self.fn is None:
+            return super().collect()
+        try:
+            value = self.fn()
+        except Exception as e:
+            log.warning("Metric %s could not be read: %s", self.name, e)
+            return []
+        return list(value.items()) if isinstance(value, dict) else [((), value)]
+
+
+class CallbackCounter(Gauge):
+    """Counter whose values are kept elsewhere (e.g. a ``stats`` dict) and read at scrape time."""
+
+    type = "counter"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # Per-bucket counts, then +Inf, sum and count
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self.lock:
+            items = [(key, list(counts)) for key, counts in self.values.items()]
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(counts[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {counts[-1]}")
+        return lines
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+http_duration = Histogram("http_request_duration_seconds", "Time to produce an HTTP response (headers, for streams)", ["method", "route"])
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests being handled")
+remote_duration = Histogram("remote_call_duration_seconds", "Twelve Labs and Gemini calls", ["service", "call", "outcome"])
+span_duration = Histogram("span_duration_seconds", "Timed sections of request and ingest work", ["span", "outcome"])
+cache_requests = Counter("cache_requests_total", "Lookups answered from a cache or validator", ["cache", "result"])
+
+
+# --- tracing
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def trace(trace_id=None):
+    """Run the block under ``trace_id`` (a new one if None), restoring the previous trace after."""
+    token = trace_id_var.set(trace_id or new_trace_id())
+    parent = span_id_var.set(None)
+    try:
+        yield trace_id_var.get()
+    finally:
+        span_id_var.reset(parent)
+        trace_id_var.reset(token)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time a section of work as a child of the current span."""
+    span_id = uuid.uuid4().hex[:8]
+    parent_id = span_id_var.get()
+    token = span_id_var.set(span_id)
+    started = time.time()
+    clock = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield attributes
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - clock
+        span_id_var.reset(token)
+        span_duration.observe(duration, span=name, outcome=outcome)
+        record = {"trace_id": trace_id_var.get(), "span_id": span_id, "parent_id": parent_id, "name": name,
+                  "start": started, "duration_ms": round(duration * 1000, 2), "outcome": outcome, **attributes}
+        _spans.append(record)
+        log.debug("span %s %.1fms %s %s", name, duration * 1000, outcome, attributes or "")
+
+
+@contextmanager
+def remote_call(service, call):
+    """Time one call to a remote API, as a span and in ``remote_call_duration_seconds``."""
+    clock = time.perf_counter()
+    outcome = "ok"
+    try:
+        with span(f"{service}.{call}"):
+            yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        remote_duration.observe(time.perf_counter() - clock, service=service, call=call, outcome=outcome)
+
+
+def bind_context(fn):
+    """Run ``fn`` in a copy of the caller's context, so work handed to a thread pool stays in its trace."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def bind_iter(iterable):
+    """Iterate ``iterable`` in a copy of the caller's context, for streamed responses whose chunks are produced elsewhere."""
+    context = contextvars.copy_context()
+    iterator = iter(iterable)
+    try:
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        if hasattr(iterator, "close"):
+            context.run(iterator.close)
+
+
+def spans_for(trace_id):
+    return [record for record in list(_spans) if record["trace_id"] == trace_id]
+
+
+def cache_lookup(cache, hit):
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# --- logging
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = trace_id_var.get() or "-"
+        return True
+
+
+def setup_logging():
+    """Log to stderr with the trace id on every line; ``LOG_LEVEL`` sets verbosity (DEBUG includes spans)."""
+    root = logging.getLogger()
+    if any(isinstance(f, TraceIdFilter) for handler in root.handlers for f in handler.filters):
+        return
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceIdFilter())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
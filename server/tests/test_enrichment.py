@@ -0,0 +1,100 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from enrichment import Stage, run_stages
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+def sleeper(seconds, result):
+    def fn(*args):
+        time.sleep(seconds)
+        return result
+    return fn
+
+
+def test_dependencies_receive_results_in_order(executor):
+    results = run_stages([
+        Stage("a", lambda: 1),
+        Stage("b", lambda: 2),
+        Stage("sum", lambda a, b: (a, b), deps=["a", "b"]),
+    ], executor)
+    assert results == {"a": 1, "b": 2, "sum": (1, 2)}
+
+
+def test_failed_stage_uses_fallback_and_reports_error(executor):
+    done = []
+
+    def boom():
+        raise RuntimeError("remote call failed")
+
+    results = run_stages([
+        Stage("a", boom, fallback="fallback"),
+        Stage("b", lambda a: a.upper(), deps=["a"]),
+    ], executor, on_stage_done=lambda name, result, error: done.append((name, result, error)))
+    assert results == {"a": "fallback", "b": "FALLBACK"}
+    assert done[0][0] == "a" and isinstance(done[0][2], RuntimeError)
+    assert done[1] == ("b", "FALLBACK", None)
+
+
+def test_running_stage_past_timeout_uses_fallback(executor):
+    done = []
+    started = time.time()
+    results = run_stages([Stage("slow", sleeper(1, "late"), timeout=0.2, fallback="fallback")], executor,
+                         on_stage_done=lambda name, result, error: done.append(error))
+    assert results == {"slow": "fallback"}
+    assert isinstance(done[0], TimeoutError)
+    assert time.time() - started < 0.8
+
+
+def test_timeout_starts_when_a_worker_picks_the_stage_up(executor):
+    # 8 stages of 0.5s on 2 workers take 2s in total, but none runs for longer than its 0.8s timeout
+    stages = [Stage(f"s{i}", sleeper(0.5, i), timeout=0.8, fallback="fallback") for i in range(8)]
+    assert run_stages(stages, executor) == {f"s{i}": i for i in range(8)}
+
+
+def test_stage_waiting_too_long_for_a_worker_uses_fallback():
+    done = []
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pool.submit(time.sleep, 2)  # Another graph's work holding the only worker
+        results = run_stages([Stage("queued", lambda: "ran", timeout=0.2, fallback="fallback")], pool,
+                             on_stage_done=lambda name, result, error: done.append(error))
+        elapsed = time.time() - started
+    assert results == {"queued": "fallback"}
+    assert isinstance(done[0], TimeoutError)
+    assert elapsed < 1.5
+
+
+def test_max_in_flight_limits_submitted_stages():
+    lock = threading.Lock()
+    active = [0, 0]  # current, peak
+
+    def tracked(i):
+        def fn():
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return i
+        return fn
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        # The pool has free workers beyond the cap
+        results = run_stages([Stage(f"s{i}", tracked(i)) for i in range(10)], pool, max_in_flight=3)
+    assert results == {f"s{i}": i for i in range(10)}
+    assert active[1] == 3
+
+
+def test_unresolvable_dependency_raises(executor):
+    with pytest.raises(ValueError, match="Unresolvable"):
+        run_stages([Stage("a", lambda missing: missing, deps=["missing"])], executor)
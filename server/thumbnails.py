@@ -0,0 +1,108 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+
+log = logging.getLogger(__name__)
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second on average, with bursts of up to ``capacity``."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ThumbnailService:
+    """Front for thumbnail generation that keeps load spikes to a bounded number of remote calls.
+
+    - Concurrent requests for the same video_id share one generation (single flight).
+    - Calls are rate limited by a token bucket and capped at ``max_concurrent`` in flight.
+    - Failures are retried with exponential backoff and jitter.
+    - A video whose generation failed is not retried for ``negative_ttl`` seconds.
+
+    ``generate_fn(video_id, summary)`` returns the thumbnail URL, or None if no image came back.
+    """
+
+    def __init__(self, generate_fn, max_concurrent=2, rate=1.0, burst=4, retries=2, backoff=1.0, negative_ttl=300):
+        self.generate_fn = generate_fn
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.retries = retries
+        self.backoff = backoff
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        self.in_flight = {}  # video_id -> Future
+        self.failures = {}  # video_id -> (expires_at, message)
+        self.stats = {"calls": 0, "coalesced": 0, "negative_hits": 0, "failures": 0}
+
+    def get(self, video_id, summary):
+        """Return a thumbnail URL for ``video_id``, raising ThumbnailError if it can't be generated."""
+        with self.lock:
+            failure = self.failures.get(video_id)
+            if failure:
+                expires_at, message = failure
+                if time.time() < expires_at:
+                    self.stats["negative_hits"] += 1
+                    raise ThumbnailError(f"{message} (recent failure, retry later)")
+                del self.failures[video_id]
+            future = self.in_flight.get(video_id)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.in_flight[video_id] = future
+            else:
+                self.stats["coalesced"] += 1
+
+        if owner:
+            try:
+                future.set_result(self._generate(video_id, summary))
+            except Exception as e:
+                with self.lock:
+                    self.failures[video_id] = (time.time() + self.negative_ttl, str(e))
+                    self.stats["failures"] += 1
+                future.set_exception(e if isinstance(e, ThumbnailError) else ThumbnailError(str(e)))
+            finally:
+                with self.lock:
+                    del self.in_flight[video_id]
+        return future.result()
+
+    def _generate(self, video_id, summary):
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                with self.slots:
+                    with self.lock:
+                        self.stats["calls"] += 1
+                    url = self.generate_fn(video_id, summary)
+                if not url:
+                    raise ThumbnailError("No image data in response")
+                return url
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                log.warning("Thumbnail attempt %d for %s failed (%s), retrying in %.1fs", attempt + 1, video_id, e, delay)
+                time.sleep(delay)